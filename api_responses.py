@@ -0,0 +1,53 @@
+import os
+import logging
+from typing import Any
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+# Optional accelerators: orjson if installed, else ujson (requirements1.txt), else the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+logger = logging.getLogger("api_responses")
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
+# Compression level (gzip 1-9; brotli quality is this value capped at 11)
+COMPRESS_LEVEL = int(os.getenv("API_COMPRESS_LEVEL", "5"))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson or ujson when available"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        if ujson is not None:
+            return ujson.dumps(content, ensure_ascii=False).encode("utf-8")
+        return super().render(content)
+
+
+def json_encoder_name() -> str:
+    """Encoder FastJSONResponse uses in this environment"""
+    return "orjson" if orjson is not None else "ujson" if ujson is not None else "json"
+
+
+def add_compression(app: FastAPI, minimum_size: int = COMPRESS_MIN_BYTES, level: int = COMPRESS_LEVEL):
+    """Compress responses above minimum_size: brotli when brotli-asgi is installed, gzip otherwise"""
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, quality=min(level, 11), minimum_size=minimum_size, gzip_fallback=True)
+        logger.info(f"Compressing responses over {minimum_size} bytes with brotli (gzip fallback)")
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=level)
+        logger.info(f"Compressing responses over {minimum_size} bytes with gzip")
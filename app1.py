@@ -1,5 +1,5 @@
 import streamlit as st
-from chatbot1 import BarberChatbot
+from chatbot1 import BarberChatbot, new_conversation_context
 import os
 from dotenv import load_dotenv
 import json
@@ -108,6 +108,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ---------- Init Chatbot ----------
+# One shared, stateless engine per process; conversation state lives in st.session_state
 @st.cache_resource
 def init_chatbot():
     try:
@@ -121,7 +122,10 @@ chatbot = init_chatbot()
 # ---------- Session State ----------
 if "messages" not in st.session_state:
     st.session_state.messages = []
-    st.session_state.chatbot_context = chatbot.context.copy() if chatbot else {}
+    st.session_state.chatbot_context = new_conversation_context()
+
+# This browser session's booking state, passed to the engine on every turn
+session_context = st.session_state.chatbot_context
 
 # ---------- Header ----------
 st.markdown("""
@@ -253,7 +257,7 @@ with st.sidebar:
     st.markdown("---")
     
     # Booking progress tracker
-    if chatbot and chatbot.context.get("booking_step") != "initial":
+    if chatbot and session_context.get("booking_step") != "initial":
         st.subheader("📋 Booking Progress")
         
         booking_steps = {
@@ -267,7 +271,7 @@ with st.sidebar:
             "completed": "🎉 Booked & Calendared"
         }
         
-        current_step = chatbot.context.get("booking_step", "initial")
+        current_step = session_context.get("booking_step", "initial")
         
         for step, label in booking_steps.items():
             if step == current_step:
@@ -277,14 +281,29 @@ with st.sidebar:
             else:
                 st.markdown(f"⭕ {label}")
     
+    # Calendar events are created in the background; pick up the result once it lands
+    if chatbot and session_context.get("booking_ref") and not session_context.get("calendar_event_id"):
+        calendar = chatbot.calendar_status(session_context["booking_ref"]) or {}
+        if calendar.get("calendar_status") == "confirmed":
+            session_context["calendar_event_id"] = calendar.get("calendar_event_id") or session_context["booking_ref"]
+        else:
+            st.markdown("---")
+            st.subheader("📅 Calendar Info")
+            if calendar.get("calendar_status") == "failed":
+                st.warning("Your booking is confirmed, but the Google Calendar invite could not be created.")
+            elif calendar.get("calendar_status") == "needs_review":
+                st.info("Your booking is confirmed. The salon is checking that your Google Calendar invite went out.")
+            else:
+                st.info("⏳ Your booking is confirmed. The Google Calendar invite is being created...")
+    
     # Show calendar event info if available
-    if chatbot and chatbot.context.get("calendar_event_id"):
+    if chatbot and session_context.get("calendar_event_id"):
         st.markdown("---")
         st.subheader("📅 Calendar Info")
         st.markdown(f"""
         <div class="calendar-info">
             <strong>📅 Google Calendar Event Created</strong><br>
-            Event ID: {chatbot.context.get("calendar_event_id")[:20]}...
+            Event ID: {session_context.get("calendar_event_id")[:20]}...
         </div>
         """, unsafe_allow_html=True)
     
@@ -292,26 +311,34 @@ with st.sidebar:
     if chatbot and st.checkbox("🔍 Show Context"):
         st.subheader("🧠 Current Context")
         context_display = {
-            "Booking Step": st.session_state.chatbot_context.get("booking_step", "initial"),
-            "Selected Barber": st.session_state.chatbot_context.get("selected_barber", "None"),
-            "Barber ID": st.session_state.chatbot_context.get("selected_barber_id", "None"),
-            "Selected Service": st.session_state.chatbot_context.get("selected_service", "None"),
-            "Selected Slot": st.session_state.chatbot_context.get("selected_slot", "None"),
-            "Customer Name": st.session_state.chatbot_context.get("customer_name", "None"),
-            "Customer Phone": st.session_state.chatbot_context.get("customer_phone", "None"),
-            "Customer Email": st.session_state.chatbot_context.get("customer_email", "None"),
-            "Calendar Event ID": st.session_state.chatbot_context.get("calendar_event_id", "None")
+            "Booking Step": session_context.get("booking_step", "initial"),
+            "Selected Barber": session_context.get("selected_barber", "None"),
+            "Barber ID": session_context.get("selected_barber_id", "None"),
+            "Selected Service": session_context.get("selected_service", "None"),
+            "Selected Slot": session_context.get("selected_slot", "None"),
+            "Customer Name": session_context.get("customer_name", "None"),
+            "Customer Phone": session_context.get("customer_phone", "None"),
+            "Customer Email": session_context.get("customer_email", "None"),
+            "Calendar Event ID": session_context.get("calendar_event_id", "None")
         }
         
         for key, value in context_display.items():
             st.text(f"{key}: {value}")
     
+    # Performance counters
+    if chatbot and st.checkbox("📈 Show Performance"):
+        st.subheader("⚡ Performance")
+        st.text(f"LLM calls avoided: {chatbot.llm_calls_avoided}")
+        cache_stats = chatbot.response_cache_stats
+        st.text(f"Response cache hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})")
+        webhook_stats = chatbot.webhook.stats()
+        st.text(f"Webhook calls: {webhook_stats['calls']} (retries {webhook_stats['retries']}, p95 {webhook_stats['latency_ms_p95']} ms)")
+    
     # Reset conversation
     if st.button("🔄 Reset Conversation", key="reset"):
         if chatbot:
-            chatbot.reset_conversation()
+            chatbot.reset_conversation(session_context)
             st.session_state.messages = []
-            st.session_state.chatbot_context = chatbot.context.copy()
             st.success("✅ Conversation reset!")
             st.rerun()
 
@@ -369,7 +396,7 @@ with chat_container:
                 """, unsafe_allow_html=True)
 
 # Show current booking step if in progress
-if chatbot and chatbot.context.get("booking_step") not in ["initial", "completed"]:
+if chatbot and session_context.get("booking_step") not in ["initial", "completed"]:
     step_descriptions = {
         "barber_selected": "🎯 You've selected a barber! Now choose a service.",
         "service_selected": "✂️ Great choice! Now pick your preferred time slot.",
@@ -379,7 +406,7 @@ if chatbot and chatbot.context.get("booking_step") not in ["initial", "completed
         "confirming_booking": "⏳ Creating your Google Calendar appointment..."
     }
     
-    current_step = chatbot.context.get("booking_step")
+    current_step = session_context.get("booking_step")
     if current_step in step_descriptions:
         st.markdown(f"""
         <div class="booking-step">
@@ -390,6 +417,32 @@ if chatbot and chatbot.context.get("booking_step") not in ["initial", "completed
 # ---------- Chat Input ----------
 st.markdown("---")
 
+def stream_assistant_reply(message: str) -> str:
+    """Show the user message and render the assistant reply as it streams in"""
+    st.markdown(f"""
+    <div class="chat-message user-message">
+        <strong>🧑 You:</strong> {message}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    placeholder = st.empty()
+    placeholder.markdown("""
+    <div class="chat-message bot-message">
+        <strong>🤖 Assistant:</strong> 🤔 Thinking...
+    </div>
+    """, unsafe_allow_html=True)
+    
+    response = ""
+    for chunk in chatbot.generate_response_stream(message, session_context):
+        response += chunk
+        formatted_content = response.replace('\n', '<br>')
+        placeholder.markdown(f"""
+        <div class="chat-message bot-message">
+            <strong>🤖 Assistant:</strong> {formatted_content}
+        </div>
+        """, unsafe_allow_html=True)
+    return response
+
 # Create columns for input and examples
 col1, col2 = st.columns([3, 1])
 
@@ -402,35 +455,30 @@ with col1:
             # Add user message
             st.session_state.messages.append({"role": "user", "content": prompt})
             
-            # Show typing indicator
-            with st.spinner("🤔 AI is thinking..."):
-                try:
-                    # Generate response
-                    response = chatbot.generate_response(prompt)
-                    
-                    # Add bot response
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    
-                    # Update context
-                    st.session_state.chatbot_context = chatbot.context.copy()
-                    
-                    # Show success message if booking was completed
-                    if chatbot.context.get("booking_confirmed"):
-                        st.balloons()
-                        st.success("🎉 Appointment booked successfully and added to Google Calendar!")
-                    
-                    # Show error if booking failed
-                    elif chatbot.context.get("booking_failed"):
-                        st.error("❌ Booking failed. Please try again or contact support.")
-                    
-                    # Auto-refresh to show updated messages
-                    st.rerun()
-                    
-                except Exception as e:
-                    error_msg = f"Error processing your request: {str(e)}"
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                    st.error("❌ An error occurred. Please try again.")
-                    st.rerun()
+            try:
+                # Generate response, rendering it as it streams in
+                response = stream_assistant_reply(prompt)
+                
+                # Add bot response
+                st.session_state.messages.append({"role": "assistant", "content": response})
+                
+                # Show success message if booking was completed
+                if session_context.get("booking_confirmed"):
+                    st.balloons()
+                    st.success("🎉 Appointment booked successfully! Your Google Calendar invite is on its way.")
+                
+                # Show error if booking failed
+                elif session_context.get("booking_failed"):
+                    st.error("❌ Booking failed. Please try again or contact support.")
+                
+                # Auto-refresh to show updated messages
+                st.rerun()
+                
+            except Exception as e:
+                error_msg = f"Error processing your request: {str(e)}"
+                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                st.error("❌ An error occurred. Please try again.")
+                st.rerun()
 
 with col2:
     st.subheader("💡 Quick Actions")
@@ -450,15 +498,13 @@ with col2:
                 # Add user message
                 st.session_state.messages.append({"role": "user", "content": message})
                 
-                # Generate response
-                with st.spinner("🤔 Processing..."):
-                    try:
-                        response = chatbot.generate_response(message)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
-                        st.session_state.chatbot_context = chatbot.context.copy()
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                # Generate response, rendering it as it streams in
+                try:
+                    response = stream_assistant_reply(message)
+                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
             else:
                 st.error("❌ Chatbot not available")
 
@@ -0,0 +1,81 @@
+import re
+import heapq
+from bisect import bisect_left
+from typing import List, Dict, Any, NamedTuple, Optional, Iterable
+from barber_cache import BarberSnapshot
+from slots import SlotIndex, format_slot_key, now_key
+
+# Openings returned when the caller doesn't say how many
+DEFAULT_LIMIT = 5
+
+# "who's free soonest", "earliest slot for a fade", "next available barber", ...
+_EARLIEST_RE = re.compile(
+    r"\b(?:earliest|soonest|asap|as soon as possible|first (?:available|free|open)"
+    r"|next (?:available|free|open)|free (?:soon|next)|available (?:soon|next))\b",
+    re.IGNORECASE
+)
+
+
+class Opening(NamedTuple):
+    key: int           # slot key (UTC epoch minutes)
+    barber_id: Any
+    barber_name: str
+    raw: Any           # stored slot value
+
+    @property
+    def formatted(self) -> str:
+        return format_slot_key(self.key)
+
+
+def asks_for_earliest(text: str) -> bool:
+    """Whether a message asks for the soonest opening rather than a specific barber's slots"""
+    return bool(text) and _EARLIEST_RE.search(text) is not None
+
+
+def merge_earliest(barbers: Iterable[Dict[str, Any]], indexes: Dict[Any, SlotIndex],
+                   after: Optional[int], limit: int) -> List[Opening]:
+    """The first limit openings at or after `after` across several barbers' sorted slot keys.
+
+    k-way merge: each barber contributes a cursor (found by bisect) to a heap
+    of size k, and each opening taken advances only that barber's cursor, so
+    the cost is O(k log m + limit log k) however many slots each barber has.
+    """
+    heap = []
+    for order, barber in enumerate(barbers):
+        index = indexes.get(barber["id"])
+        if index is None:
+            continue
+        keys = index.keys
+        pos = 0 if after is None else bisect_left(keys, after)
+        if pos < len(keys):
+            # Barber order breaks ties, so equal times come back in roster order
+            heap.append((keys[pos], order, pos, barber, index))
+    heapq.heapify(heap)
+
+    openings: List[Opening] = []
+    while heap and len(openings) < limit:
+        key, order, pos, barber, index = heap[0]
+        openings.append(Opening(key, barber["id"], barber["name"], index.raw(key)))
+        if pos + 1 < len(index.keys):
+            heapq.heapreplace(heap, (index.keys[pos + 1], order, pos + 1, barber, index))
+        else:
+            heapq.heappop(heap)
+    return openings
+
+
+def earliest_openings(snapshot: BarberSnapshot, service: Optional[str] = None, after: Optional[int] = None,
+                      limit: int = DEFAULT_LIMIT) -> List[Opening]:
+    """Next openings across every barber offering service (any barber when None), from after (default now)"""
+    directory = snapshot.directory
+    barbers = directory.barbers_for_service(service) if service else list(directory.by_id.values())
+    indexes = {barber["id"]: snapshot.slot_index(barber["id"]) for barber in barbers}
+    return merge_earliest(barbers, indexes, now_key() if after is None else after, limit)
+
+
+def render_openings(openings: List[Opening], service: Optional[str] = None) -> str:
+    """Prompt section listing the soonest openings, earliest first"""
+    title = f"EARLIEST AVAILABLE FOR {service.upper()}" if service else "EARLIEST AVAILABLE SLOTS"
+    if not openings:
+        return f"{title}:\nNo open slots found.\n"
+    lines = [f"- {o.formatted} with {o.barber_name} (ID: {o.barber_id})" for o in openings]
+    return f"{title} (soonest first, across all barbers):\n" + "\n".join(lines) + "\n"
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from typing import List, Dict, Any, Callable, Awaitable, Optional
+from barber_directory import BarberDirectory
+from slots import SlotIndex, EMPTY_SLOT_INDEX
+from mention_matcher import MentionMatcher
+
+logger = logging.getLogger("barber_cache")
+
+# Seconds a barber snapshot may be served before it is re-fetched
+DEFAULT_TTL_SECONDS = float(os.getenv("BARBER_CACHE_TTL", "30"))
+
+
+class BarberSnapshot:
+    """Immutable view of all barbers at one point in time"""
+
+    def __init__(self, version: int, barbers: List[Dict[str, Any]], fetched_at: float):
+        self.version = version
+        self.barbers = barbers
+        self.fetched_at = fetched_at
+        # Wall-clock time the content last changed (set by the cache on install)
+        self.changed_at = time.time()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.RLock()
+        self._slot_indexes: Dict[Any, SlotIndex] = {}
+
+    def derived(self, key: str, factory: Callable[["BarberSnapshot"], Any]) -> Any:
+        """Build a structure from this snapshot once and memoize it"""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = factory(self)
+                    self._derived[key] = value
+        return value
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of the snapshot, stable across processes (unlike version)"""
+        return self.derived(
+            "fingerprint",
+            lambda snapshot: hashlib.sha1(
+                json.dumps(snapshot.barbers, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+        )
+
+    @property
+    def directory(self) -> BarberDirectory:
+        """Id, name and service indexes for this snapshot"""
+        return self.derived("directory", lambda snapshot: BarberDirectory(snapshot.barbers))
+
+    @property
+    def mentions(self) -> MentionMatcher:
+        """Barber/service mention matcher for this snapshot"""
+        return self.derived("mentions", lambda snapshot: MentionMatcher(snapshot.directory))
+
+    def slot_index(self, barber_id: Any) -> SlotIndex:
+        """Parsed slots for one barber, built on first use (empty if unknown)"""
+        index = self._slot_indexes.get(barber_id)
+        if index is None:
+            barber = self.directory.get(barber_id)
+            if barber is None:
+                return EMPTY_SLOT_INDEX
+            # Racing builders produce identical indexes, so no lock is needed
+            index = self._slot_indexes.setdefault(barber_id, SlotIndex(barber["slots"]))
+        return index
+
+
+class BarberSnapshotCache:
+    """Process-wide barber snapshot with TTL expiry and explicit invalidation"""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[BarberSnapshot] = None
+        self._version = 0
+        # Fingerprint and change time of the last installed snapshot, kept across invalidations
+        self._last_fingerprint: Optional[str] = None
+        self._changed_at = time.time()
+        # One asyncio.Lock per event loop; a lock is bound to the loop that first awaits it
+        self._async_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+    @property
+    def version(self) -> int:
+        """Monotonic version, bumped on every refresh and invalidation"""
+        return self._version
+
+    def _is_fresh(self, snapshot: Optional[BarberSnapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.fetched_at < self.ttl_seconds
+
+    def get(self, loader: Callable[[], List[Dict[str, Any]]]) -> BarberSnapshot:
+        """Return the current snapshot, calling loader() for barber records when stale"""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            return self._install(loader() or [])
+
+    async def aget(self, loader: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> BarberSnapshot:
+        """Async get(): one coroutine refreshes while the others await it"""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        async with self._loop_lock():
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            barbers = await loader() or []
+            with self._lock:
+                return self._install(barbers)
+
+    def _loop_lock(self) -> asyncio.Lock:
+        """The refresh lock of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._async_locks.get(loop)
+            if lock is None:
+                lock = self._async_locks[loop] = asyncio.Lock()
+            return lock
+
+    def _install(self, barbers: List[Dict[str, Any]]) -> BarberSnapshot:
+        """Publish a new snapshot of barber records (caller holds self._lock)"""
+        self._version += 1
+        snapshot = BarberSnapshot(self._version, barbers, time.monotonic())
+        # A refresh that loads identical data keeps the previous change time
+        if snapshot.fingerprint != self._last_fingerprint:
+            self._last_fingerprint = snapshot.fingerprint
+            self._changed_at = snapshot.changed_at
+        snapshot.changed_at = self._changed_at
+        self._snapshot = snapshot
+        logger.info(f"Barber snapshot v{snapshot.version} loaded ({len(snapshot.barbers)} barbers)")
+        return snapshot
+
+    def invalidate(self):
+        """Drop the current snapshot so the next read re-fetches (call after writes)"""
+        with self._lock:
+            self._snapshot = None
+            self._version += 1
+        logger.info(f"Barber snapshot invalidated (now v{self._version})")
+
+
+# Shared by chatbot1 and endpoints1
+snapshot_cache = BarberSnapshotCache()
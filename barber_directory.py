@@ -0,0 +1,65 @@
+from typing import List, Dict, Any, Optional, Tuple
+
+
+def normalize_name(name: Any) -> str:
+    """Normalize a barber or service name for lookups"""
+    return " ".join(str(name or "").lower().split())
+
+
+def split_services(services: Any) -> Tuple[str, ...]:
+    """Split the comma-separated Services column"""
+    if not isinstance(services, str):
+        return ()
+    return tuple(s.strip() for s in services.split(",") if s.strip())
+
+
+class BarberDirectory:
+    """Lookup indexes over one barber snapshot, built once per snapshot"""
+
+    def __init__(self, barbers: List[Dict[str, Any]]):
+        self.barbers = barbers
+        self.by_id: Dict[Any, Dict[str, Any]] = {}
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.services_by_id: Dict[Any, Tuple[str, ...]] = {}
+        # normalized service -> ids of barbers offering it (in roster order)
+        self.barbers_by_service: Dict[str, Tuple[Any, ...]] = {}
+        # normalized service -> display name (first spelling seen)
+        self.service_names: Dict[str, str] = {}
+
+        service_index: Dict[str, List[Any]] = {}
+        for barber in barbers:
+            barber_id = barber["id"]
+            # First row wins, matching the old linear scans
+            self.by_id.setdefault(barber_id, barber)
+            self.by_name.setdefault(normalize_name(barber["name"]), barber)
+
+            services = split_services(barber["services"])
+            self.services_by_id.setdefault(barber_id, services)
+            for service in services:
+                key = normalize_name(service)
+                self.service_names.setdefault(key, service)
+                ids = service_index.setdefault(key, [])
+                if barber_id not in ids:
+                    ids.append(barber_id)
+
+        self.barbers_by_service = {k: tuple(v) for k, v in service_index.items()}
+
+    def get(self, barber_id: Any) -> Optional[Dict[str, Any]]:
+        """Get barber by ID"""
+        return self.by_id.get(barber_id)
+
+    def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get barber by case/whitespace-insensitive name"""
+        return self.by_name.get(normalize_name(name))
+
+    def services(self, barber_id: Any) -> Tuple[str, ...]:
+        """Services offered by a barber"""
+        return self.services_by_id.get(barber_id, ())
+
+    def barbers_for_service(self, service: str) -> List[Dict[str, Any]]:
+        """Barbers offering a service (case-insensitive)"""
+        return [self.by_id[i] for i in self.barbers_by_service.get(normalize_name(service), ())]
+
+    def all_services(self) -> List[str]:
+        """Every distinct service across all barbers, sorted"""
+        return sorted(self.service_names.values())
@@ -0,0 +1,327 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple, TypedDict
+import slots_table
+from slots_table import use_slots_table
+from slots import SlotIndex, EMPTY_SLOT_INDEX, parse_display, key_to_iso
+from barber_directory import split_services, normalize_name
+from slot_reservation import reserve_slot, areserve_slot
+from barber_cache import snapshot_cache, BarberSnapshot
+
+logger = logging.getLogger("barber_repository")
+
+BARBERS_TABLE = "Barber_bookings"
+# Name of the availability array column; found from the table's columns when unset
+SLOT_COLUMN = os.getenv("BARBER_SLOT_COLUMN") or None
+
+
+class BarberRecord(TypedDict):
+    id: Any
+    name: str
+    services: str      # comma-separated, as stored
+    slots: List[Any]   # stored slot values (empty when not loaded)
+
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards (and commas, which PostgREST treats as separators) in a literal"""
+    return "".join("\\" + ch if ch in "\\%_," else ch for ch in value)
+
+
+def find_slot_column(row: Dict[str, Any]) -> Optional[str]:
+    """Find the available slots column (case-insensitive)"""
+    for k in row.keys():
+        if "available" in k.lower() and "slot" in k.lower():
+            return k
+    return None
+
+
+def snapshot_page(snapshot: BarberSnapshot, after_id: Optional[int], limit: Optional[int],
+                  service: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None,
+                  require_slots: bool = False) -> Tuple[List[BarberRecord], Optional[int]]:
+    """barbers_page() answered from the in-memory snapshot, using its id, service and slot indexes"""
+    barbers = snapshot.derived("barbers_by_id", lambda snap: sorted(snap.barbers, key=lambda b: b["id"]))
+    if after_id is not None:
+        ids = snapshot.derived("sorted_ids", lambda snap: [b["id"] for b in barbers])
+        barbers = barbers[bisect_right(ids, after_id):]
+    if service:
+        offering = {b["id"] for b in snapshot.directory.barbers_for_service(service)}
+        barbers = [b for b in barbers if b["id"] in offering]
+
+    page: List[BarberRecord] = []
+    for barber in barbers:
+        if require_slots and not snapshot.slot_index(barber["id"]).between(start, end):
+            continue
+        if limit and len(page) == limit:
+            return page, page[-1]["id"]
+        page.append(barber)
+    return page, None
+
+
+class BarberRepository:
+    """Every Barber_bookings query made by the chatbot and the API.
+
+    Selects only the columns a call needs, resolves the availability column
+    once, and returns BarberRecords. The shared snapshot cache, query metrics
+    and the choice of backend (array column or slots table, hosted Supabase
+    or a stand-in client) all live here.
+    """
+
+    def __init__(self, client: Any, async_client_factory: Optional[Callable[[], Awaitable[Any]]] = None,
+                 slot_column: Optional[str] = SLOT_COLUMN):
+        self.client = client
+        self._async_client_factory = async_client_factory
+        self._async_client = None
+        self._slot_column = slot_column
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    # ---------- Metrics ----------
+    @contextmanager
+    def _timed(self, operation: str):
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                entry = self._metrics.setdefault(operation, {"calls": 0, "errors": 0, "total_ms": 0.0})
+                entry["calls"] += 1
+                entry["errors"] += failed
+                entry["total_ms"] += elapsed * 1000
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Calls, errors and mean latency per repository operation"""
+        with self._lock:
+            return {
+                operation: {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "mean_ms": round(entry["total_ms"] / entry["calls"], 1) if entry["calls"] else 0.0
+                }
+                for operation, entry in self._metrics.items()
+            }
+
+    # ---------- Clients and columns ----------
+    async def async_client(self) -> Any:
+        """Async Supabase client, created on first use"""
+        if self._async_client is None:
+            if self._async_client_factory is None:
+                raise RuntimeError("BarberRepository has no async client")
+            self._async_client = await self._async_client_factory()
+        return self._async_client
+
+    def _record(self, row: Dict[str, Any], slot_column: Optional[str] = None) -> BarberRecord:
+        return {
+            "id": row.get("id"),
+            "name": (row.get("Barber") or "").strip(),
+            "services": row.get("Services") or "",
+            "slots": row.get(slot_column or self._slot_column or "") or []
+        }
+
+    def _remember_slot_column(self, rows: List[Dict[str, Any]]):
+        self._slot_column = (find_slot_column(rows[0]) if rows else None) or slots_table.SLOT_COLUMN
+        logger.info(f"Availability column resolved to '{self._slot_column}'")
+
+    def _columns(self) -> str:
+        if use_slots_table():
+            return slots_table.BARBER_COLUMNS
+        if self._slot_column is None:
+            return "*"
+        return f'{slots_table.BARBER_COLUMNS},"{self._slot_column}"'
+
+    def _records(self, rows: List[Dict[str, Any]]) -> List[BarberRecord]:
+        if self._slot_column is None and not use_slots_table():
+            # First read used select("*"); later ones project
+            self._remember_slot_column(rows)
+        return [self._record(row) for row in rows]
+
+    @staticmethod
+    def _data(response: Any) -> List[Dict[str, Any]]:
+        error = getattr(response, "error", None)
+        if error:
+            logger.error("Supabase error: %s", error)
+            raise RuntimeError(str(error))
+        return response.data or []
+
+    # ---------- Reads ----------
+    def list_barbers(self) -> List[BarberRecord]:
+        """All barbers with their open slots"""
+        with self._timed("list_barbers"):
+            if use_slots_table():
+                return [
+                    self._record(row, slots_table.SLOT_COLUMN) for row in slots_table.fetch_barber_rows(self.client)
+                ]
+            return self._records(self._data(self.client.table(BARBERS_TABLE).select(self._columns()).execute()))
+
+    async def alist_barbers(self) -> List[BarberRecord]:
+        """Async list_barbers() on the async Supabase client"""
+        client = await self.async_client()
+        with self._timed("list_barbers"):
+            if use_slots_table():
+                return [
+                    self._record(row, slots_table.SLOT_COLUMN) for row in await slots_table.afetch_barber_rows(client)
+                ]
+            return self._records(self._data(await client.table(BARBERS_TABLE).select(self._columns()).execute()))
+
+    def get_barber(self, barber_id: int) -> Optional[BarberRecord]:
+        """One barber, with open slots unless they live in the slots table"""
+        with self._timed("get_barber"):
+            rows = self._records(self._data(
+                self.client.table(BARBERS_TABLE).select(self._columns()).eq("id", barber_id).limit(1).execute()
+            ))
+            return rows[0] if rows else None
+
+    def open_slot(self, barber: BarberRecord, slot_text: str) -> Optional[Any]:
+        """Stored value of a displayed slot if the barber still has it open"""
+        if not use_slots_table():
+            index = SlotIndex(barber["slots"])
+            key = index.find_display(slot_text)
+            return index.raw(key) if key is not None else None
+        key = parse_display(slot_text)
+        if key is None:
+            return None
+        open_slots = self.available_slots(barber["id"], key, key + 1)
+        return open_slots[0] if open_slots else None
+
+    def available_slots(self, barber_id: int, start: Optional[int] = None, end: Optional[int] = None) -> List[Any]:
+        """One barber's open slots in key range [start, end), filtered in the database when possible"""
+        with self._timed("available_slots"):
+            if use_slots_table():
+                return slots_table.fetch_available(self.client, barber_id, start, end)
+            barber = self.get_barber(barber_id)
+            index = SlotIndex(barber["slots"]) if barber else EMPTY_SLOT_INDEX
+            if start is None and end is None:
+                return index.raw_slots()
+            return [index.raw(k) for k in index.between(start, end)]
+
+    def available_slots_for(self, barber_ids: List[int], start: Optional[int] = None,
+                            end: Optional[int] = None) -> Dict[Any, List[Any]]:
+        """Open slots in [start, end) for several barbers, by barber id, in one query.
+
+        Reads the slots table in table mode and the barbers' slot arrays otherwise.
+        """
+        with self._timed("available_slots_for"):
+            if use_slots_table():
+                return slots_table.fetch_open_slots(self.client, barber_ids, start, end)
+            rows = self._records(self._data(
+                self.client.table(BARBERS_TABLE).select(self._columns()).in_("id", list(barber_ids)).execute()
+            ))
+            found = {}
+            for barber in rows:
+                index = SlotIndex(barber["slots"])
+                found[barber["id"]] = [index.raw(k) for k in index.between(start, end)]
+            return found
+
+    def barbers_page(self, after_id: Optional[int], limit: Optional[int], service: Optional[str] = None,
+                     start: Optional[int] = None, end: Optional[int] = None,
+                     require_slots: bool = False, slot_limit: Optional[int] = None,
+                     count_slots: bool = True) -> Tuple[List[BarberRecord], Optional[int]]:
+        """Slots-table mode: barbers after after_id (by id) with open slots in [start, end), usually in one query.
+
+        Service (as a substring, then matched exactly here), id cursor, page
+        size, slot status, time range, slot order and the per-barber slot_limit
+        are applied by PostgREST; when substring-only matches leave a page
+        short, the next rows are fetched until it is full. Slots are
+        embedded per barber (inner join when require_slots). Without a range,
+        slots come from the snapshot horizon (slots_table.horizon_bounds). When
+        slot_limit trims the embed and count_slots is set, each record also gets
+        "slot_total", the number of open slots in range. Returns the page and
+        the id to continue after, if any.
+        """
+        if start is None:
+            horizon_start, horizon_end = slots_table.horizon_bounds()
+            start, end = horizon_start, horizon_end if end is None else end
+        counted = slot_limit is not None and count_slots
+        embeds = ["slots!inner(start_time)" if require_slots else "slots(start_time)"]
+        if counted:
+            embeds.append("slot_total:slots(count)")
+        wanted = normalize_name(service) if service else None
+
+        def page_query(cursor: Optional[int]):
+            query = self.client.table(BARBERS_TABLE).select(",".join([slots_table.BARBER_COLUMNS] + embeds))
+            for embed in ("slots", "slot_total") if counted else ("slots",):
+                query = query.eq(f"{embed}.status", slots_table.AVAILABLE)
+                if start is not None:
+                    query = query.gte(f"{embed}.start_time", key_to_iso(start))
+                if end is not None:
+                    query = query.lt(f"{embed}.start_time", key_to_iso(end))
+            query = query.order("start_time", foreign_table="slots")
+            if slot_limit is not None:
+                # At least one row, so an inner join still sees the barber's slots
+                query = query.limit(max(slot_limit, 1), foreign_table="slots")
+            if cursor is not None:
+                query = query.gt("id", cursor)
+            if service:
+                query = query.ilike("Services", f"%{_escape_like(service)}%")
+            query = query.order("id")
+            if limit:
+                # One extra row tells us whether another page exists
+                query = query.limit(limit + 1)
+            return query
+
+        records = []
+        cursor = after_id
+        with self._timed("barbers_page"):
+            while True:
+                rows = self._data(page_query(cursor).execute())
+                for row in rows:
+                    record = self._record(row)
+                    # ilike is a substring match; keep barbers that offer exactly this service
+                    if wanted and wanted not in {normalize_name(s) for s in split_services(record["services"])}:
+                        continue
+                    record["slots"] = [slot["start_time"] for slot in row.get("slots") or []]
+                    if counted:
+                        record["slot_total"] = sum(entry.get("count", 0) for entry in row.get("slot_total") or [])
+                    records.append(record)
+                # Substring-only matches can leave the page short; read on until it is full
+                if not limit or len(records) > limit or len(rows) <= limit:
+                    break
+                cursor = rows[-1]["id"]
+
+        next_after = None
+        if limit and len(records) > limit:
+            records = records[:limit]
+            next_after = records[-1]["id"]
+        return records, next_after
+
+    def ping(self) -> bool:
+        """Whether the barbers table answers a one-row query"""
+        with self._timed("ping"):
+            response = self.client.table(BARBERS_TABLE).select("id").limit(1).execute()
+            return not getattr(response, "error", None)
+
+    # ---------- Snapshot ----------
+    def snapshot(self) -> BarberSnapshot:
+        """Shared barber snapshot, reloaded through this repository when stale"""
+        return snapshot_cache.get(self.list_barbers)
+
+    async def asnapshot(self, loader: Optional[Callable[[], Awaitable[List[BarberRecord]]]] = None) -> BarberSnapshot:
+        """Async snapshot(); loader defaults to alist_barbers (the API passes a thread-pool one)"""
+        return await snapshot_cache.aget(loader or self.alist_barbers)
+
+    # ---------- Writes ----------
+    def reserve_slot(self, barber_id: int, raw_slot: Any) -> str:
+        """Atomically book one open slot (see slot_reservation); refreshes the snapshot"""
+        with self._timed("reserve_slot"):
+            try:
+                return reserve_slot(self.client, barber_id, raw_slot)
+            finally:
+                # Reserved or taken, the snapshot no longer matches the database
+                snapshot_cache.invalidate()
+
+    async def areserve_slot(self, barber_id: int, raw_slot: Any) -> str:
+        """Async reserve_slot()"""
+        client = await self.async_client()
+        with self._timed("reserve_slot"):
+            try:
+                return await areserve_slot(client, barber_id, raw_slot)
+            finally:
+                snapshot_cache.invalidate()
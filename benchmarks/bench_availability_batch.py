@@ -0,0 +1,116 @@
+"""Week view: POST /availability/batch against one GET /barbers/{id}/availability per barber per day.
+
+Runs endpoints1.app in-process against the local Supabase backend with
+injected query latency. "warm" serves every request from a cached snapshot;
+"cold" drops the snapshot before each request, so every request re-fetches
+and re-parses the roster the way uncached calls do. With --slots-source table
+dated lookups are range queries on the slots table whatever the snapshot
+holds, so only the warm case is run.
+
+Run from the repository root:
+    python benchmarks/bench_availability_batch.py [--barbers 20] [--days 7] [--db-latency 0.02] [--slots-source table]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+SERVICES = "Hair Cut, Beard Trim, Shaving, Fade"
+FIRST_DAY = date(2024, 1, 1)
+
+
+def make_rows(count: int, days: int):
+    start = datetime.combine(FIRST_DAY, datetime.min.time())
+    slots = [
+        (start + timedelta(days=d, hours=h)).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        for d in range(days) for h in (9, 10, 11, 12, 14, 15, 16, 17)
+    ]
+    return [{"id": i, "Barber": f"Barber{i}", "Services": SERVICES, "Available Slots": list(slots)} for i in range(1, count + 1)]
+
+
+async def individual(client, barber_ids, dates, cold, invalidate):
+    slots = 0
+    for barber_id in barber_ids:
+        for day in dates:
+            if cold:
+                invalidate()
+            response = await client.get(f"/barbers/{barber_id}/availability", params={"date": day})
+            response.raise_for_status()
+            slots += response.json()["total_available"]
+    return slots
+
+
+async def batch(client, barber_ids, dates, cold, invalidate):
+    if cold:
+        invalidate()
+    response = await client.post(
+        "/availability/batch", json={"barber_ids": barber_ids, "date_from": dates[0], "date_to": dates[-1]}
+    )
+    response.raise_for_status()
+    return sum(b["total_available"] for b in response.json()["barbers"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--barbers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--roster", type=int, default=200, help="barbers in the table")
+    parser.add_argument("--schedule-days", type=int, default=60, help="days of slots stored per barber")
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    parser.add_argument("--slots-source", choices=("array", "table"), default="array")
+    args = parser.parse_args()
+
+    # Explicit values so .env1 is never consulted for real services
+    os.environ["SUPABASE_BACKEND"] = "local"
+    os.environ["SLOTS_SOURCE"] = args.slots_source
+    os.environ["SLOTS_HORIZON_DAYS"] = "0"
+    os.environ["N8N_WEBHOOK_URL"] = "http://127.0.0.1:9/webhook"
+    os.environ["BOOKING_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+
+    import logging
+    import endpoints1
+    from barber_cache import snapshot_cache
+    from barber_repository import BarberRepository
+    from supabase_backend import LocalDatabase
+    logging.disable(logging.INFO)
+
+    barber_ids = list(range(1, args.barbers + 1))
+    dates = [(FIRST_DAY + timedelta(days=d)).isoformat() for d in range(args.days)]
+    print(f"{args.barbers} barbers x {args.days} days out of {args.roster} barbers x {args.schedule_days} days, "
+          f"{args.db_latency * 1000:.0f}ms per query, slots from the {args.slots_source}\n")
+    print(f"{'snapshot':<9} {'approach':<26} {'requests':>9} {'queries':>8} {'slots':>7} {'ms':>9}")
+
+    async def run():
+        transport = httpx.ASGITransport(app=endpoints1.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for cold in (False, True) if args.slots_source == "array" else (False,):
+                for name, approach, requests in (
+                    (f"{args.barbers}x{args.days} GET availability", individual, args.barbers * args.days),
+                    ("1 POST /availability/batch", batch, 1)
+                ):
+                    database = LocalDatabase({"Barber_bookings": make_rows(args.roster, args.schedule_days)}, args.db_latency)
+                    endpoints1.repository = BarberRepository(database.client())
+                    snapshot_cache.invalidate()
+                    await client.get("/")
+                    if not cold:
+                        await endpoints1._get_snapshot()
+                    before = database.stats()["queries"]
+                    started = time.perf_counter()
+                    slots = await approach(client, barber_ids, dates, cold, snapshot_cache.invalidate)
+                    elapsed = time.perf_counter() - started
+                    queries = database.stats()["queries"] - before
+                    label = "cold" if cold else "warm"
+                    print(f"{label:<9} {name:<26} {requests:>9} {queries:>8} {slots:>7} {elapsed * 1000:>9.1f}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Earliest-available search: heap k-way merge against scanning and sorting every slot.
+
+Builds a synthetic snapshot and asks for the next --limit openings for one
+service, starting partway through the schedule, both ways. Slot indexes are
+built before timing, as they are once per snapshot in the running services.
+
+Run from the repository root:
+    python benchmarks/bench_earliest.py [--barbers 500] [--days 90] [--limit 10]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from barber_cache import BarberSnapshot  # noqa: E402
+from availability_search import earliest_openings  # noqa: E402
+from slots import parse_display  # noqa: E402
+
+SERVICES = ["Hair Cut, Beard Trim", "Fade, Hair Wash", "Shaving, Fade, Hair Cut"]
+
+
+def make_snapshot(count: int, days: int) -> BarberSnapshot:
+    start = datetime(2024, 1, 1)
+    barbers = []
+    for i in range(1, count + 1):
+        hours = [h for h in range(9, 19) if (h + i) % 3]
+        slots = [
+            (start + timedelta(days=d, hours=h, minutes=15 * (i % 4))).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+            for d in range(days) for h in hours
+        ]
+        barbers.append({"id": i, "name": f"Barber{i}", "services": SERVICES[i % 3], "slots": slots})
+    return BarberSnapshot(1, barbers, time.time())
+
+
+def scan_and_sort(snapshot: BarberSnapshot, service: str, after: int, limit: int):
+    found = []
+    for barber in snapshot.directory.barbers_for_service(service):
+        index = snapshot.slot_index(barber["id"])
+        found.extend((key, barber["id"]) for key in index.keys if key >= after)
+    found.sort()
+    return found[:limit]
+
+
+def best_ms(func, number: int) -> float:
+    timings = []
+    for _ in range(number):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--barbers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    snapshot = make_snapshot(args.barbers, args.days)
+    for barber in snapshot.barbers:
+        snapshot.slot_index(barber["id"])
+    service = "Fade"
+    after = parse_display(f"{datetime(2024, 1, 1) + timedelta(days=args.days // 3):%Y-%m-%d} 01:00 PM")
+
+    merged = [(o.key, o.barber_id) for o in earliest_openings(snapshot, service, after, args.limit)]
+    assert merged == scan_and_sort(snapshot, service, after, args.limit), "merge and scan disagree"
+
+    barbers = len(snapshot.directory.barbers_for_service(service))
+    slots = sum(len(snapshot.slot_index(b["id"])) for b in snapshot.directory.barbers_for_service(service))
+    print(f"{barbers} barbers offering {service}, {slots} open slots between them, next {args.limit}\n")
+    print(f"{'approach':<16} {'ms':>9}")
+    print(f"{'scan + sort':<16} {best_ms(lambda: scan_and_sort(snapshot, service, after, args.limit), args.number):>9.3f}")
+    print(f"{'heap merge':<16} {best_ms(lambda: earliest_openings(snapshot, service, after, args.limit), args.number):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""GET /barbers payload size and JSON encoding time on a large synthetic roster.
+
+Compares FastAPI's default encoding path (jsonable_encoder + json.dumps) with
+FastJSONResponse, full objects with ?fields= sparse fieldsets, and identity
+with gzip (and brotli, when installed) transfer encodings. The last table runs
+endpoints1.app in-process against the local Supabase backend.
+
+Run from the repository root:
+    python benchmarks/bench_encoding.py [--barbers 500] [--days 30] [--number 5]
+"""
+import os
+import sys
+import gzip
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SERVICES = "Hair Cut, Beard Trim, Shaving, Fade"
+FIELDSETS = [None, "id,name,available_slots_formatted", "id,name,total_slots"]
+
+
+def make_rows(count: int, days: int):
+    start = datetime(2024, 1, 1)
+    slots = [
+        (start + timedelta(days=d, hours=h)).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        for d in range(days) for h in (9, 10, 11, 12, 14, 15, 16, 17)
+    ]
+    return [{"id": i, "Barber": f"Barber{i}", "Services": SERVICES, "Available Slots": slots} for i in range(1, count + 1)]
+
+
+def best_ms(func, number: int) -> float:
+    timings = []
+    for _ in range(number):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--barbers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    # Explicit values so .env1 is never consulted for real services
+    os.environ["SUPABASE_BACKEND"] = "local"
+    os.environ["N8N_WEBHOOK_URL"] = "http://127.0.0.1:9/webhook"
+    os.environ["BOOKING_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+
+    import logging
+    import endpoints1
+    from api_responses import FastJSONResponse, json_encoder_name
+    from barber_cache import snapshot_cache
+    from barber_repository import BarberRepository
+    from supabase_backend import LocalDatabase
+    logging.disable(logging.INFO)
+
+    rows = make_rows(args.barbers, args.days)
+    endpoints1.repository = BarberRepository(LocalDatabase({"Barber_bookings": rows}, 0.0).client())
+    snapshot = endpoints1.repository.snapshot()
+    print(f"{args.barbers} barbers x {len(rows[0]['Available Slots'])} slots, fast encoder: {json_encoder_name()}\n")
+
+    print(f"{'fields':<36} {'default ms':>11} {'fast ms':>9} {'bytes':>11} {'gzip':>10} {'brotli':>10}")
+    for fields in FIELDSETS:
+        selected = endpoints1._parse_fields(fields)
+        body = [endpoints1._format_barber(b, snapshot.slot_index(b["id"]), fields=selected) for b in snapshot.barbers]
+        default_ms = best_ms(lambda: JSONResponse(jsonable_encoder(body)), args.number)
+        fast_ms = best_ms(lambda: FastJSONResponse(body), args.number)
+        payload = FastJSONResponse(body).body
+        compressed = len(gzip.compress(payload, 5))
+        brotli_size = f"{len(brotli.compress(payload, quality=5)):>10}" if brotli else f"{'n/a':>10}"
+        print(f"{fields or '(all)':<36} {default_ms:>11.1f} {fast_ms:>9.1f} {len(payload):>11} {compressed:>10} {brotli_size}")
+
+    async def end_to_end():
+        transport = httpx.ASGITransport(app=endpoints1.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"\n{'GET /barbers':<52} {'ms':>8} {'bytes on wire':>14}")
+            for fields in FIELDSETS:
+                for encoding in ("identity", "gzip"):
+                    params = {"fields": fields} if fields else {}
+                    headers = {"Accept-Encoding": encoding}
+                    await client.get("/barbers", params=params, headers=headers)
+                    timings = []
+                    for _ in range(args.number):
+                        started = time.perf_counter()
+                        response = await client.get("/barbers", params=params, headers=headers)
+                        timings.append(time.perf_counter() - started)
+                    wire = response.headers.get("content-length") or len(response.content)
+                    label = f"{'fields=' + fields if fields else '(all)'} [{encoding}]"
+                    print(f"{label:<52} {min(timings) * 1000:>8.1f} {wire:>14}")
+
+    snapshot_cache.invalidate()
+    asyncio.run(end_to_end())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""/barbers throughput while slow n8n webhook calls and bookings are in flight.
+
+Runs endpoints1.app in-process against a local slow webhook and the local
+Supabase backend (supabase_backend.LocalDatabase), first with blocking calls
+made inline on the event loop (the old behaviour), then with the thread-pool
+offload. The webhook load is POST /test-webhook, which calls n8n through
+run_webhook; the database load is POST /bookings, which reserves slots through
+run_db. Bookings don't wait on n8n (the outbox worker sends their calendar
+webhooks in the background), so only the /test-webhook calls hold the loop
+for the webhook delay in blocking mode.
+
+Run from the repository root:
+    python benchmarks/bench_event_loop.py [--webhook-delay 2] [--webhook-calls 5] [--bookings 20] [--seconds 3]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from slots import parse_slot, format_slot_key  # noqa: E402
+
+SERVICES = "Hair Cut, Beard Trim, Shaving, Fade"
+
+
+def make_rows(count: int):
+    return [
+        {
+            "id": i,
+            "Barber": f"Barber{i}",
+            "Services": SERVICES,
+            "Available Slots": [f"2024-01-0{d}T{h:02d}:00:00+00:00" for d in range(1, 6) for h in (9, 10, 11, 14, 15)]
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def start_slow_webhook(delay: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            body = json.dumps({"calendar_event_id": "evt", "booking_id": 1}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _inline(func, *args):
+    return func(*args)
+
+
+async def measure(endpoints, bookings: int, webhook_calls: int, seconds: float, readers: int = 10):
+    transport = httpx.ASGITransport(app=endpoints.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def read_loop(started, deadline, latencies):
+            # At least one request each, timed from the start of the phase, so a
+            # loop blocked past the deadline still shows up in the numbers
+            while True:
+                response = await client.get("/barbers")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                if time.perf_counter() >= deadline:
+                    break
+                # In-process requests never touch a socket; yield like a real client would
+                await asyncio.sleep(0)
+                started = time.perf_counter()
+
+        async def throughput():
+            # Requests per wall-clock second, so time the loop spent blocked counts against it
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*(read_loop(started, started + seconds, latencies) for _ in range(readers)))
+            return len(latencies) / (time.perf_counter() - started), max(latencies)
+
+        idle, _ = await throughput()
+
+        # A few barbers, each booked for several different slots at once
+        rows = endpoints.repository.client.database.tables["Barber_bookings"]
+        requests = [
+            {
+                "barber_id": rows[i % 5]["id"],
+                "service": "Hair Cut",
+                "appointment_time": format_slot_key(parse_slot(rows[i % 5]["Available Slots"][i // 5])),
+                "customer_name": "Bench Customer",
+                "customer_phone": "03001234567",
+                "customer_email": "bench@example.com"
+            }
+            for i in range(bookings)
+        ]
+
+        async def timed(path, body):
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            return response.status_code == 200, time.perf_counter() - started
+
+        webhooks = [asyncio.create_task(timed("/test-webhook", None)) for _ in range(webhook_calls)]
+        booked = [asyncio.create_task(timed("/bookings", booking)) for booking in requests]
+        busy, worst = await throughput()
+        webhook_results = await asyncio.gather(*webhooks)
+        booking_results = await asyncio.gather(*booked)
+    return (
+        idle, busy, worst,
+        sum(ok for ok, _ in webhook_results), max((t for _, t in webhook_results), default=0.0),
+        sum(ok for ok, _ in booking_results), max((t for _, t in booking_results), default=0.0)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--barbers", type=int, default=50)
+    parser.add_argument("--bookings", type=int, default=20)
+    parser.add_argument("--webhook-calls", type=int, default=5)
+    parser.add_argument("--webhook-delay", type=float, default=2.0)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="seconds to wait for the outbox to empty")
+    args = parser.parse_args()
+
+    server = start_slow_webhook(args.webhook_delay)
+    # Explicit values so .env1 is never consulted for real services
+    os.environ["SUPABASE_BACKEND"] = "local"
+    os.environ["N8N_WEBHOOK_URL"] = f"http://127.0.0.1:{server.server_port}/webhook"
+    os.environ["BOOKING_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+
+    import logging
+    import endpoints1
+    from barber_cache import snapshot_cache
+    from barber_repository import BarberRepository
+    from supabase_backend import LocalDatabase
+    logging.disable(logging.INFO)
+
+    print(f"{args.barbers} barbers, {args.webhook_calls} webhook calls and {args.bookings} bookings, "
+          f"n8n webhook taking {args.webhook_delay}s\n")
+    print(f"{'mode':<10} {'idle req/s':>11} {'busy req/s':>11} {'busy max':>10} "
+          f"{'webhooks ok':>12} {'webhook max':>12} {'bookings ok':>12} {'booking max':>12}")
+    offloaded = (endpoints1.run_db, endpoints1.run_webhook)
+    for mode in ("blocking", "offloaded"):
+        if mode == "blocking":
+            endpoints1.run_db = endpoints1.run_webhook = _inline
+        else:
+            endpoints1.run_db, endpoints1.run_webhook = offloaded
+        # Fresh slots for each mode, since bookings really remove them
+        endpoints1.repository = BarberRepository(LocalDatabase({"Barber_bookings": make_rows(args.barbers)}, args.db_latency).client())
+        snapshot_cache.invalidate()
+        idle, busy, worst, webhooks_ok, webhook_max, bookings_ok, booking_max = asyncio.run(
+            measure(endpoints1, args.bookings, args.webhook_calls, args.seconds)
+        )
+        print(f"{mode:<10} {idle:>11.0f} {busy:>11.0f} {worst * 1000:>8.0f}ms "
+              f"{webhooks_ok:>12} {webhook_max * 1000:>10.0f}ms {bookings_ok:>12} {booking_max * 1000:>10.0f}ms")
+
+    # Calendar webhooks for the bookings, sent by the outbox worker
+    outbox = endpoints1.booking_outbox
+    deadline = time.monotonic() + args.drain_timeout
+    while outbox.stats().get("pending") and time.monotonic() < deadline:
+        time.sleep(0.1)
+    print(f"\noutbox after run: {outbox.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-message cost of booking entity extraction, old regex chain vs single pass.
+
+Run from the repository root:
+    python benchmarks/bench_extraction.py [--barbers 50] [--number 2000]
+"""
+import os
+import re
+import sys
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from barber_directory import BarberDirectory  # noqa: E402
+from mention_matcher import MentionMatcher  # noqa: E402
+from booking_extractor import extract_entities  # noqa: E402
+
+MESSAGES = [
+    "Hi, show me all barbers",
+    "I want barber ID 3 for a Beard Trim",
+    "Book Barber7 on 2024-01-05 at 9:30 AM please",
+    "Name Ali Khan, phone 03001234567, email ali@example.com",
+    "my name is John Doe and my number is 5551234567",
+]
+
+
+def make_roster(count: int):
+    services = ["Hair Cut", "Beard Trim", "Shaving", "Hair Wash", "Fade", "Mustache Styling"]
+    return [
+        {"id": i, "name": f"Barber{i}", "services": ", ".join(services[i % 3:]), "slots": []}
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy_extract(user_input: str, barbers, services_by_id):
+    """The pre-refactor extract_booking_info searches, with every step gate open"""
+    user_input_lower = user_input.lower()
+    found = {}
+    id_match = re.search(r'\bid\s*(\d+)', user_input_lower)
+    if id_match:
+        found["barber_id"] = int(id_match.group(1))
+    for barber in barbers:
+        if barber["name"].lower() in user_input_lower:
+            found["barber"] = barber["id"]
+            break
+    for service in [s.strip() for s in barbers[0]["services"].split(",") if s.strip()]:
+        if service.lower() in user_input_lower:
+            found["service"] = service
+            break
+    for pattern in [
+        r'(\d{4}-\d{2}-\d{2}\s+(?:at\s+)?\d{1,2}:\d{2}\s+[AaPp][Mm])',
+        r'(\d{4}-\d{2}-\d{2}\s+\d{1,2}:\d{2}\s+[AaPp][Mm])',
+        r'(\d{4}-\d{1,2}-\d{1,2}\s+(?:at\s+)?\d{1,2}:\d{2}\s+[AaPp][Mm])'
+    ]:
+        match = re.search(pattern, user_input, re.IGNORECASE)
+        if match:
+            found["slot"] = re.sub(r'\s+at\s+', ' ', match.group(1).strip(), flags=re.IGNORECASE)
+            break
+    for pattern in [
+        r'name[:\s]+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+        r'my name is\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+        r'i am\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+        r'name\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
+        r'^([A-Za-z]+)\s*,',
+    ]:
+        match = re.search(pattern, user_input_lower)
+        if match:
+            found["name"] = match.group(1).title()
+            break
+    for pattern in [r'phone(?:\s+number)?[:\s]*(\d+)', r'number[:\s]*(\d+)', r'(\d{10,})']:
+        match = re.search(pattern, user_input)
+        if match and len(match.group(1)) >= 10:
+            found["phone"] = match.group(1)
+            break
+    match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', user_input)
+    if match:
+        found["email"] = match.group(0)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--barbers", type=int, default=50)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    barbers = make_roster(args.barbers)
+    directory = BarberDirectory(barbers)
+    matcher = MentionMatcher(directory)
+    services_by_id = directory.services_by_id
+
+    def run_legacy():
+        for message in MESSAGES:
+            legacy_extract(message, barbers, services_by_id)
+
+    def run_single_pass():
+        for message in MESSAGES:
+            extract_entities(message, matcher)
+
+    print(f"{args.barbers} barbers, {len(MESSAGES)} messages x {args.number} rounds")
+    for label, fn in (("legacy regex chain", run_legacy), ("single-pass extractor", run_single_pass)):
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        per_message_us = best / (args.number * len(MESSAGES)) * 1e6
+        print(f"  {label:<22} {per_message_us:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
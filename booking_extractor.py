@@ -0,0 +1,99 @@
+import re
+from typing import Any, List, NamedTuple, Optional, Tuple
+from mention_matcher import MentionMatcher
+
+# One tokenizer for every entity the booking flow understands, scanned once
+# per message. Entities are tried first at each position, so email wins over
+# the digits inside it. A name cue ("my name is", "name:", "I am") only marks
+# where a name starts; the name itself is assembled from the word tokens that
+# follow, so it can't swallow the "id 2" in "I am looking for barber id 2".
+_TOKEN_PATTERN = re.compile(
+    r"(?P<email>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)"
+    r"|(?P<slot_date>\b\d{4}-\d{1,2}-\d{1,2})\s+(?:at\s+)?(?P<slot_time>\d{1,2}:\d{2})\s*(?P<slot_ampm>[ap]m)\b"
+    r"|\bid\s*(?P<barber_id>\d+)"
+    r"|\b(?:phone(?:\s+number)?|number)[:\s]*(?P<labeled_phone>\d+)"
+    r"|(?P<phone>\d{10,})"
+    r"|(?P<name_cue>\bmy\s+name\s+is\b|\bname\b:?|\bi\s+am\b)"
+    r"|^(?P<lead_name>[a-z]+)(?=\s*,)"
+    r"|(?P<word>[a-z]+)"
+    r"|(?P<other>\d+|[^\sa-z\d])",
+    re.IGNORECASE
+)
+
+# Words that end a name: they start another entity or a new clause
+_NAME_STOP_WORDS = frozenset({"phone", "number", "email", "id", "and", "my"})
+
+MIN_PHONE_DIGITS = 10
+
+
+class Extraction(NamedTuple):
+    barber_id: Optional[int]       # explicit "id 3"
+    barbers: Tuple[Any, ...]       # barber ids mentioned by name, in text order
+    services: Tuple[str, ...]      # normalized service names, in text order
+    slot: Optional[str]            # "YYYY-MM-DD HH:MM AM" as typed
+    name: Optional[str]
+    phone: Optional[str]
+    email: Optional[str]
+    confidence: float              # 1.0 = unambiguous, lower when values conflict
+
+
+def _first_distinct(values: List[Any]) -> Tuple[Optional[Any], int]:
+    """First value and how many extra distinct candidates competed with it"""
+    if not values:
+        return None, 0
+    return values[0], len(set(values)) - 1
+
+
+def extract_entities(text: str, matcher: Optional[MentionMatcher] = None) -> Extraction:
+    """Extract every booking entity from a message in a single scan"""
+    emails, slots, ids, labeled, bare, names = [], [], [], [], [], []
+    name_words: Optional[List[str]] = None
+
+    for match in _TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "word":
+            word = match.group("word")
+            if name_words is not None and word.lower() not in _NAME_STOP_WORDS:
+                name_words.append(word)
+                continue
+        if name_words:
+            names.append(" ".join(name_words).title())
+        name_words = None
+
+        if kind == "name_cue":
+            name_words = []
+        elif kind == "lead_name":
+            names.append(match.group("lead_name").title())
+        elif kind == "email":
+            emails.append(match.group("email"))
+        elif kind == "slot_ampm":
+            slots.append(f"{match.group('slot_date')} {match.group('slot_time')} {match.group('slot_ampm').upper()}")
+        elif kind == "barber_id":
+            ids.append(int(match.group("barber_id")))
+        elif kind == "labeled_phone":
+            if len(match.group("labeled_phone")) >= MIN_PHONE_DIGITS:
+                labeled.append(match.group("labeled_phone"))
+        elif kind == "phone":
+            bare.append(match.group("phone"))
+    if name_words:
+        names.append(" ".join(name_words).title())
+
+    mentions = matcher.find(text) if matcher else []
+    barbers = tuple(m.value for m in mentions if m.kind == "barber")
+    services = tuple(m.value for m in mentions if m.kind == "service")
+
+    barber_id, id_conflicts = _first_distinct(ids)
+    slot, slot_conflicts = _first_distinct(slots)
+    name, name_conflicts = _first_distinct(names)
+    phone, phone_conflicts = _first_distinct(labeled + bare)
+    email, email_conflicts = _first_distinct(emails)
+
+    found = [barber_id, slot, name, phone, email] + list(barbers[:1]) + list(services[:1])
+    if not any(v is not None for v in found):
+        confidence = 0.0
+    else:
+        conflicts = (id_conflicts + slot_conflicts + name_conflicts + phone_conflicts
+                     + email_conflicts + max(len(set(barbers)) - 1, 0))
+        confidence = 1.0 / (1 + conflicts)
+
+    return Extraction(barber_id, barbers, services, slot, name, phone, email, confidence)
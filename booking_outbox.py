@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+from webhook_client import webhook_client_for, is_retryable, may_have_delivered
+
+logger = logging.getLogger("booking_outbox")
+
+OUTBOX_DB_PATH = os.getenv("BOOKING_OUTBOX_DB", "booking_outbox.sqlite3")
+MAX_ATTEMPTS = int(os.getenv("BOOKING_OUTBOX_MAX_ATTEMPTS", "8"))
+RETRY_BASE_SECONDS = float(os.getenv("BOOKING_OUTBOX_RETRY_BASE", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("BOOKING_OUTBOX_RETRY_MAX", "600"))
+POLL_SECONDS = float(os.getenv("BOOKING_OUTBOX_POLL", "2"))
+# Webhooks delivered concurrently by the worker
+DELIVERY_THREADS = int(os.getenv("BOOKING_OUTBOX_THREADS", "4"))
+# A claimed entry whose worker died is picked up again after this long; well
+# above one webhook send (N8N_CONNECT_TIMEOUT + N8N_READ_TIMEOUT, 33s by default)
+LEASE_SECONDS = 120.0
+
+# calendar_status values reported to callers
+PENDING = "pending"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+# The webhook failed after it was sent (read timeout, dropped connection), so
+# n8n may have created the event; resending could duplicate it, so the entry
+# waits for a person to check
+NEEDS_REVIEW = "needs_review"
+
+
+class BookingOutbox:
+    """Durable SQLite queue of n8n calendar webhooks, drained by a background worker.
+
+    A booking is confirmed as soon as its slot is reserved and its webhook is
+    queued here; the Google Calendar event follows asynchronously. Only
+    failures WebhookClient would retry are resent; a read timeout or dropped
+    connection parks the entry as needs_review. Several processes may share one file: entries are
+    leased before they are sent.
+    """
+
+    def __init__(self, db_path: str = OUTBOX_DB_PATH, max_attempts: int = MAX_ATTEMPTS,
+                 retry_base: float = RETRY_BASE_SECONDS, retry_max: float = RETRY_MAX_SECONDS,
+                 poll_seconds: float = POLL_SECONDS, delivery_threads: int = DELIVERY_THREADS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_seconds = poll_seconds
+        self.delivery_threads = delivery_threads
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS booking_outbox ("
+                "booking_ref TEXT PRIMARY KEY, "
+                "webhook_url TEXT NOT NULL, "
+                "user_agent TEXT NOT NULL, "
+                "booking_data TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt_at REAL NOT NULL, "
+                "leased_until REAL NOT NULL DEFAULT 0, "
+                "last_error TEXT, "
+                "result TEXT, "
+                "created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS booking_outbox_due ON booking_outbox (status, next_attempt_at)"
+            )
+            self._db.commit()
+        return self._db
+
+    def enqueue(self, booking_data: Dict[str, Any], webhook_url: str, user_agent: str) -> str:
+        """Queue the calendar webhook for a reserved booking; returns its booking reference"""
+        booking_ref = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT INTO booking_outbox (booking_ref, webhook_url, user_agent, booking_data, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (booking_ref, webhook_url, user_agent, json.dumps(booking_data, default=str), PENDING, now, now, now)
+            )
+            db.commit()
+        logger.info(f"Queued calendar webhook for booking {booking_ref}")
+        self.start()
+        self._wakeup.set()
+        return booking_ref
+
+    def status(self, booking_ref: str) -> Optional[Dict[str, Any]]:
+        """Calendar status of a booking, or None if the reference is unknown"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, attempts, last_error, result, created_at, updated_at "
+                "FROM booking_outbox WHERE booking_ref = ?", (booking_ref,)
+            ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[3]) if row[3] else {}
+        return {
+            "booking_ref": booking_ref,
+            "calendar_status": row[0],
+            "attempts": row[1],
+            "last_error": row[2],
+            "calendar_event_id": result.get("calendar_event_id"),
+            "calendar_link": result.get("calendar_link"),
+            "booking_id": result.get("booking_id"),
+            "queued_at": row[4],
+            "updated_at": row[5]
+        }
+
+    def _claim_due(self, limit: int = 10) -> List[tuple]:
+        """Lease up to limit due entries to this worker"""
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            rows = db.execute(
+                "SELECT booking_ref, webhook_url, user_agent, booking_data, attempts FROM booking_outbox "
+                "WHERE status = ? AND next_attempt_at <= ? AND leased_until <= ? "
+                "ORDER BY next_attempt_at LIMIT ?", (PENDING, now, now, limit)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                # Conditional update, so only one worker (or process) wins each entry
+                cursor = db.execute(
+                    "UPDATE booking_outbox SET leased_until = ? WHERE booking_ref = ? AND leased_until <= ?",
+                    (now + LEASE_SECONDS, row[0], now)
+                )
+                if cursor.rowcount:
+                    claimed.append(row)
+            db.commit()
+        return claimed
+
+    def _deliver(self, booking_ref: str, webhook_url: str, user_agent: str, booking_data: str, attempts: int):
+        attempts += 1
+        try:
+            # One send per attempt: the outbox owns retries and backoff, so an
+            # attempt never outlives its lease (see LEASE_SECONDS)
+            result = webhook_client_for(webhook_url, user_agent).send_booking(
+                json.loads(booking_data), idempotency_key=booking_ref, max_retries=0
+            )
+            update = ("status = ?, result = ?, last_error = NULL", (CONFIRMED, json.dumps(result, default=str)))
+            logger.info(f"Calendar event created for booking {booking_ref}")
+        except Exception as e:
+            if may_have_delivered(e):
+                update = ("status = ?, last_error = ?", (NEEDS_REVIEW, str(e)))
+                logger.error(f"Calendar webhook for booking {booking_ref} failed after sending, needs review: {str(e)}")
+            elif not is_retryable(e):
+                update = ("status = ?, last_error = ?", (FAILED, str(e)))
+                logger.error(f"Calendar webhook for booking {booking_ref} failed permanently: {str(e)}")
+            elif attempts >= self.max_attempts:
+                update = ("status = ?, last_error = ?", (FAILED, str(e)))
+                logger.error(f"Giving up on calendar webhook for booking {booking_ref}: {str(e)}")
+            else:
+                delay = random.uniform(0.5, 1.0) * min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+                update = ("next_attempt_at = ?, last_error = ?", (time.time() + delay, str(e)))
+                logger.warning(f"Calendar webhook for booking {booking_ref} failed, retrying in {delay:.0f}s: {str(e)}")
+
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                f"UPDATE booking_outbox SET {update[0]}, attempts = ?, leased_until = 0, updated_at = ? "
+                "WHERE booking_ref = ?",
+                (*update[1], attempts, time.time(), booking_ref)
+            )
+            db.commit()
+
+    def drain(self) -> int:
+        """Send every due entry once; returns how many were attempted"""
+        attempted = 0
+        with ThreadPoolExecutor(max_workers=self.delivery_threads, thread_name_prefix="booking-outbox") as pool:
+            while True:
+                batch = self._claim_due(self.delivery_threads * 2)
+                if not batch:
+                    return attempted
+                list(pool.map(lambda row: self._deliver(*row), batch))
+                attempted += len(batch)
+
+    def _run(self):
+        while True:
+            # Clear before draining so an enqueue during the drain still wakes us
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Booking outbox worker error: {str(e)}")
+            self._wakeup.wait(self.poll_seconds)
+
+    def start(self):
+        """Start the background worker (idempotent); also drains entries left by a previous run"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="booking-outbox", daemon=True)
+                self._worker.start()
+
+    def stats(self) -> Dict[str, int]:
+        """Number of entries per calendar status"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) FROM booking_outbox GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+
+# Shared by chatbot1 and endpoints1
+booking_outbox = BookingOutbox()
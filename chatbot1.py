@@ -634,15 +634,33 @@
 
 
 import os
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from supabase import create_client, Client
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Iterator
+from supabase import Client
 from dotenv import load_dotenv
 import google.generativeai as genai
 from datetime import datetime
-import json
-import re
 import requests
+import httpx
+from supabase_backend import create_client, acreate_client, uses_local_backend
+from webhook_client import webhook_client_for
+from booking_outbox import booking_outbox, PENDING
+from slot_reservation import RESERVED, TAKEN
+from barber_repository import BarberRepository
+from barber_cache import BarberSnapshot
+from barber_directory import BarberDirectory, normalize_name
+from mention_matcher import MentionMatcher
+from booking_extractor import extract_entities
+from knowledge_base import knowledge_base, KNOWLEDGE_BASE_HEADER
+from retrieval import retrieval_index, render_fragments
+from availability_search import Opening, earliest_openings, asks_for_earliest, render_openings, DEFAULT_LIMIT
+from prompts import PromptParts, STATIC_INSTRUCTIONS, render_data_block, render_turn_suffix
+from prompt_cache import prefix_cache, GEMINI_MODEL_NAME
+from response_templates import DeterministicResponder
+from response_cache import response_cache, make_cache_key
+from slots import SlotIndex, EMPTY_SLOT_INDEX, parse_slot, parse_display, format_slot_key
 
 # Load environment variables
 load_dotenv(".env1")
@@ -650,6 +668,31 @@ load_dotenv(".env1")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("BarberChatbot")
 
+WEBHOOK_USER_AGENT = "BarberSalonChatbot/1.0"
+
+# Holds the snapshot an async turn fetched with aget_snapshot(), so the sync
+# helpers it calls read that one instead of blocking the loop on a reload
+_turn_snapshot: ContextVar[Optional[Dict[str, BarberSnapshot]]] = ContextVar("turn_snapshot", default=None)
+
+
+def new_conversation_context() -> Dict[str, Any]:
+    """Fresh per-session conversation state"""
+    return {
+        "booking_step": "initial",
+        "selected_barber": None,
+        "selected_barber_id": None,
+        "selected_service": None,
+        "selected_slot": None,
+        "customer_name": None,
+        "customer_phone": None,
+        "customer_email": None,
+        "booking_confirmed": False,
+        "booking_failed": False,
+        "calendar_event_id": None,
+        "booking_ref": None,
+        "conversation_history": []
+    }
+
 
 class BarberChatbot:
     def __init__(self):
@@ -657,10 +700,14 @@ class BarberChatbot:
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY")
         
-        if not self.supabase_url or not self.supabase_key:
+        if not uses_local_backend() and (not self.supabase_url or not self.supabase_key):
             raise ValueError("❌ SUPABASE_URL or SUPABASE_KEY is missing in .env")
         
         self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        # All barber queries; the async client is created on first use inside the event loop
+        self.repository = BarberRepository(
+            self.client, lambda: acreate_client(self.supabase_url, self.supabase_key)
+        )
         
         # Initialize Gemini AI
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
@@ -668,194 +715,151 @@ class BarberChatbot:
             raise ValueError("❌ GEMINI_API_KEY is missing in .env")
         
         genai.configure(api_key=self.gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.model = genai.GenerativeModel(GEMINI_MODEL_NAME)
         
         # N8N Webhook URL from environment
         self.n8n_webhook_url = os.getenv("N8N_WEBHOOK_URL")
         if not self.n8n_webhook_url:
             raise ValueError("❌ N8N_WEBHOOK_URL is missing in .env1")
         
-        # Context for session
-        self.context = {
-            "booking_step": "initial",
-            "selected_barber": None,
-            "selected_barber_id": None,
-            "selected_service": None,
-            "selected_slot": None,
-            "customer_name": None,
-            "customer_phone": None,
-            "customer_email": None,
-            "booking_confirmed": False,
-            "booking_failed": False,
-            "calendar_event_id": None,
-            "conversation_history": []
-        }
+        # Default session context, used when callers don't pass their own.
+        # The engine itself is stateless, so one instance can serve many
+        # conversations as long as each passes its own context.
+        self.context = new_conversation_context()
+        
+        # Template replies for turns that don't need the LLM
+        self.responder = DeterministicResponder()
+        
+        # Pooled, retrying client for the n8n webhook (shared per URL)
+        self.webhook = webhook_client_for(self.n8n_webhook_url, WEBHOOK_USER_AGENT)
         
-        # Cache for barber data
-        self.barbers_cache = None
+        # Deliver calendar webhooks queued by this or a previous run
+        booking_outbox.start()
+
+    @property
+    def llm_calls_avoided(self) -> int:
+        """Turns answered from templates instead of Gemini"""
+        return self.responder.llm_calls_avoided
+
+    @property
+    def response_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate of the shared LLM response cache"""
+        return response_cache.stats()
 
     # ---------- Database Methods ----------
+    def get_snapshot(self) -> BarberSnapshot:
+        """Get the shared barber snapshot, refreshing it when the TTL has expired"""
+        pinned = _turn_snapshot.get()
+        if pinned and "snapshot" in pinned:
+            return pinned["snapshot"]
+        return self.repository.snapshot()
+
+    async def aget_snapshot(self) -> BarberSnapshot:
+        """Async get_snapshot(); inside agenerate_response() it also pins the snapshot for the turn"""
+        snapshot = await self.repository.asnapshot()
+        pinned = _turn_snapshot.get()
+        if pinned is not None:
+            pinned["snapshot"] = snapshot
+        return snapshot
+
     def get_barbers_data(self) -> List[Dict[str, Any]]:
         """Fetch all barbers from Supabase with caching"""
-        if self.barbers_cache is not None:
-            return self.barbers_cache
-            
         try:
-            logger.info("Fetching all barbers from Supabase")
-            response = self.client.table("Barber_bookings").select("*").execute()
-            data = response.data
-            logger.info(f"Raw Supabase response: {data}")
-
-            if not data:
-                return []
-
-            # Normalize data
-            barbers = []
-            for row in data:
-                barber_info = {
-                    "id": row.get("id"),
-                    "name": row.get("Barber", "").strip(),
-                    "services": row.get("Services", ""),
-                    "slots": row.get("Available Slots", [])
-                }
-                barbers.append(barber_info)
-            
-            self.barbers_cache = barbers
-            return barbers
+            return self.get_snapshot().barbers
         except Exception as e:
             logger.error(f"Error fetching barbers: {str(e)}")
             return []
 
+    def get_directory(self) -> BarberDirectory:
+        """Get id/name/service indexes for the current snapshot"""
+        try:
+            return self.get_snapshot().directory
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
+            return BarberDirectory([])
+
     def get_barber_by_id(self, barber_id: int) -> Optional[Dict[str, Any]]:
         """Get specific barber by ID"""
-        barbers = self.get_barbers_data()
-        for barber in barbers:
-            if barber["id"] == barber_id:
-                return barber
-        return None
+        return self.get_directory().get(barber_id)
 
     def get_barber_by_name(self, barber_name: str) -> Optional[Dict[str, Any]]:
         """Get specific barber by name"""
-        barbers = self.get_barbers_data()
-        barber_name_lower = barber_name.lower().strip()
-        for barber in barbers:
-            if barber["name"].lower() == barber_name_lower:
-                return barber
-        return None
+        return self.get_directory().find_by_name(barber_name)
+
+    def get_mention_matcher(self) -> Optional[MentionMatcher]:
+        """Get the barber/service mention matcher for the current snapshot"""
+        try:
+            return self.get_snapshot().mentions
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
+            return None
+
+    def get_slot_index(self, barber_id: int) -> SlotIndex:
+        """Get parsed, sorted slots for a specific barber"""
+        try:
+            return self.get_snapshot().slot_index(barber_id)
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
+            return EMPTY_SLOT_INDEX
 
     def get_available_slots(self, barber_id: int) -> List[str]:
         """Fetch available slots for a specific barber"""
-        barber = self.get_barber_by_id(barber_id)
-        if not barber:
-            return []
-        
-        slots = barber["slots"]  # Direct access instead of .get()
-        if isinstance(slots, list):
-            return [self.format_datetime(slot) for slot in slots]
-        return []
+        return list(self.get_slot_index(barber_id).formatted())
 
     def get_barber_services(self, barber_id: int) -> List[str]:
         """Get services offered by a specific barber"""
-        barber = self.get_barber_by_id(barber_id)
-        if not barber:
+        return list(self.get_directory().services(barber_id))
+
+    def find_earliest_slots(self, service: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> List[Opening]:
+        """Soonest open slots across all barbers offering a service (any service when None)"""
+        try:
+            return earliest_openings(self.get_snapshot(), service, limit=limit)
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
             return []
-        
-        services = barber["services"]  # Direct access instead of .get()
-        if isinstance(services, str):
-            return [service.strip() for service in services.split(",") if service.strip()]
-        return []
 
     def format_datetime(self, datetime_str: str) -> str:
         """Format datetime string to readable format"""
-        try:
-            dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-            return dt.strftime("%Y-%m-%d %I:%M %p")
-        except:
-            return datetime_str
+        key = parse_slot(datetime_str)
+        return format_slot_key(key) if key is not None else datetime_str
+
+    def _webhook_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Booking result from a parsed n8n response, with pseudo ids when n8n returns none"""
+        pseudo_id = f"booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return {
+            "success": True,
+            "message": "Booking created and added to Google Calendar",
+            "calendar_event_id": result.get("calendar_event_id", pseudo_id),
+            "booking_id": result.get("booking_id", pseudo_id),
+            "calendar_link": result.get("calendar_link", "Calendar event created successfully")
+        }
 
     def call_n8n_webhook(self, booking_data: Dict[str, Any]) -> Dict[str, Any]:
         """Call n8n webhook to create booking and Google Calendar event"""
         try:
             logger.info(f"Calling n8n webhook with data: {booking_data}")
+            return self._webhook_result(self.webhook.send_booking(booking_data))
             
-            # Prepare payload for n8n webhook
-            webhook_payload = {
-                "event_type": "booking_created",
-                "booking_details": {
-                    "barber_id": booking_data["barber_id"],
-                    "barber_name": booking_data["barber_name"],
-                    "service": booking_data["service"],
-                    "appointment_time": booking_data["appointment_time"],
-                    "customer_name": booking_data["customer_name"],
-                    "customer_phone": booking_data["customer_phone"],
-                    "customer_email": booking_data.get("customer_email", ""),
-                    "status": "confirmed",
-                    "created_at": datetime.now().isoformat(),
-                    "salon_name": "AI Barber Salon",
-                    "notes": f"Booking for {booking_data['service']} with {booking_data['barber_name']}"
-                },
-                "calendar_event": {
-                    "summary": f"Barber Appointment - {booking_data['service']}",
-                    "description": f"Customer: {booking_data['customer_name']}\nPhone: {booking_data['customer_phone']}\nEmail: {booking_data['customer_email']}\nService: {booking_data['service']}\nBarber: {booking_data['barber_name']}",
-                    "start_time": booking_data["appointment_time"],
-                    "duration_minutes": 60,  # Default 1 hour appointment
-                    "attendees": [booking_data.get("customer_email", "")]
-                }
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error calling n8n webhook: {str(e)}")
+            return {
+                "success": False,
+                "error": f"Failed to create calendar event: {str(e)}"
             }
-            
-            # Make the API call
-            response = requests.post(
-                self.n8n_webhook_url,
-                json=webhook_payload,
-                headers={
-                    "Content-Type": "application/json",
-                    "User-Agent": "BarberSalonChatbot/1.0"
-                },
-                timeout=30
-            )
-            
-            response.raise_for_status()
-            
-            # Parse response - handle different response formats
-            result = {}
-            if response.content:
-                try:
-                    raw_response = response.json()
-                    logger.info(f"n8n webhook response: {raw_response}")
-                    
-                    # Handle list response format (like your current n8n setup)
-                    if isinstance(raw_response, list) and len(raw_response) > 0:
-                        # Extract calendar link from the response text
-                        if 'content' in raw_response[0] and 'parts' in raw_response[0]['content']:
-                            response_text = raw_response[0]['content']['parts'][0].get('text', '')
-                            # Extract calendar link from the email text
-                            import re
-                            calendar_link_match = re.search(r'https://www\.google\.com/calendar/event\?eid=([^\s]+)', response_text)
-                            if calendar_link_match:
-                                result['calendar_link'] = calendar_link_match.group(0)
-                        
-                        # Generate a pseudo event ID from the response
-                        result['calendar_event_id'] = f"booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                        result['booking_id'] = result['calendar_event_id']
-                    
-                    # Handle standard JSON response format  
-                    elif isinstance(raw_response, dict):
-                        result = raw_response
-                        
-                except json.JSONDecodeError:
-                    logger.warning("Could not parse JSON response, treating as success")
-                    result = {}
-            
-            # Always return success if the HTTP request succeeded
+        except Exception as e:
+            logger.error(f"Unexpected error in n8n webhook call: {str(e)}")
             return {
-                "success": True,
-                "message": "Booking created and added to Google Calendar",
-                "calendar_event_id": result.get("calendar_event_id", f"booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"),
-                "booking_id": result.get("booking_id", f"booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"),
-                "calendar_link": result.get("calendar_link", "Calendar event created successfully")
+                "success": False,
+                "error": f"Booking system error: {str(e)}"
             }
+
+    async def acall_n8n_webhook(self, booking_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async call_n8n_webhook()"""
+        try:
+            logger.info(f"Calling n8n webhook with data: {booking_data}")
+            return self._webhook_result(await self.webhook.asend_booking(booking_data))
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error calling n8n webhook: {str(e)}")
             return {
                 "success": False,
@@ -868,395 +872,431 @@ class BarberChatbot:
                 "error": f"Booking system error: {str(e)}"
             }
 
+    def _booking_data(self, barber: Dict[str, Any], service: str, slot: str, customer_name: str,
+                      customer_phone: str, customer_email: str) -> Dict[str, Any]:
+        """Booking record handed to the n8n webhook"""
+        return {
+            "barber_id": barber["id"],
+            "barber_name": barber["name"],
+            "service": service,
+            "appointment_time": slot,
+            "customer_name": customer_name,
+            "customer_phone": customer_phone,
+            "customer_email": customer_email,
+            "status": "confirmed",
+            "created_at": datetime.now().isoformat()
+        }
+
+    def _booking_success(self, booking_ref: str) -> Dict[str, Any]:
+        """Result returned once the slot is reserved and the calendar webhook is queued"""
+        return {
+            "success": True,
+            "message": "Appointment booked successfully; Google Calendar event pending",
+            "booking_ref": booking_ref,
+            "calendar_status": PENDING,
+            "calendar_event_id": None,
+            "calendar_link": None
+        }
+
+    def _stored_slot(self, barber_id: int, slot: str) -> Optional[Any]:
+        """Stored value of a displayed slot, or None if the barber no longer offers it"""
+        index = self.get_slot_index(barber_id)
+        key = parse_display(slot)
+        if key is None or key not in index:
+            return None
+        return index.raw(key)
+
+    def _reservation_error(self, outcome: str) -> Optional[Dict[str, Any]]:
+        """Booking error for a reserve_slot outcome, or None if the slot is ours"""
+        if outcome == RESERVED:
+            return None
+        if outcome == TAKEN:
+            return {"success": False, "error": "That time slot was just booked by someone else"}
+        return {"success": False, "error": "Barber not found"}
+
     def book_appointment(self, barber_id: int, service: str, slot: str, customer_name: str, customer_phone: str, customer_email: str = "") -> Dict[str, Any]:
-        """Book appointment in the database and Google Calendar via n8n webhook"""
+        """Reserve the slot in the database, then queue the Google Calendar webhook"""
         try:
             barber = self.get_barber_by_id(barber_id)
             if not barber:
                 return {"success": False, "error": "Barber not found"}
             
             # Prepare booking data
-            booking_data = {
-                "barber_id": barber_id,
-                "barber_name": barber["name"],
-                "service": service,
-                "appointment_time": slot,
-                "customer_name": customer_name,
-                "customer_phone": customer_phone,
-                "customer_email": customer_email,
-                "status": "confirmed",
-                "created_at": datetime.now().isoformat()
-            }
+            booking_data = self._booking_data(barber, service, slot, customer_name, customer_phone, customer_email)
             
-            # Call n8n webhook to create booking and calendar event
-            webhook_result = self.call_n8n_webhook(booking_data)
+            # Reserve the slot first - the database, not the calendar, decides who gets it
+            stored_slot = self._stored_slot(barber_id, slot)
+            if stored_slot is None:
+                return {"success": False, "error": "That time slot is no longer available"}
             
-            if not webhook_result["success"]:
-                return webhook_result
+            # The repository refreshes the shared snapshot, so every reader sees the outcome
+            error = self._reservation_error(self.repository.reserve_slot(barber_id, stored_slot))
+            if error:
+                return error
             
-            # Update available slots in Supabase (remove booked slot)
-            try:
-                current_slots = barber["slots"]
-                updated_slots = []
-                
-                for existing_slot in current_slots:
-                    formatted_slot = self.format_datetime(existing_slot)
-                    if formatted_slot != slot:
-                        updated_slots.append(existing_slot)
-                
-                # Update the barber's available slots in database
-                update_response = self.client.table("Barber_bookings").update({
-                    "Available Slots": updated_slots
-                }).eq("id", barber_id).execute()
-                
-                # Check if update was successful - handle Supabase APIResponse properly
-                if hasattr(update_response, 'data') and update_response.data:
-                    logger.info("Successfully updated available slots")
-                else:
-                    logger.warning("Could not update available slots, but booking still successful")
-                
-            except Exception as slot_error:
-                logger.error(f"Error updating available slots: {str(slot_error)}")
-                # Don't fail the booking if slot update fails, just log it
+            # The calendar event is created in the background; the booking stands either way
+            booking_ref = booking_outbox.enqueue(booking_data, self.n8n_webhook_url, WEBHOOK_USER_AGENT)
+            return self._booking_success(booking_ref)
             
-            # Clear cache to force refresh
-            self.barbers_cache = None
+        except Exception as e:
+            logger.error(f"Error booking appointment: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    async def abook_appointment(self, barber_id: int, service: str, slot: str, customer_name: str, customer_phone: str, customer_email: str = "") -> Dict[str, Any]:
+        """Async book_appointment() on the async Supabase client"""
+        try:
+            await self.aget_snapshot()
+            barber = self.get_barber_by_id(barber_id)
+            if not barber:
+                return {"success": False, "error": "Barber not found"}
             
-            # Store calendar event ID in context
-            self.context["calendar_event_id"] = webhook_result.get("calendar_event_id")
+            booking_data = self._booking_data(barber, service, slot, customer_name, customer_phone, customer_email)
             
-            return {
-                "success": True,
-                "message": "Appointment booked successfully and added to Google Calendar",
-                "calendar_event_id": webhook_result.get("calendar_event_id"),
-                "booking_id": webhook_result.get("booking_id"),
-                "calendar_link": webhook_result.get("calendar_link")
-            }
+            stored_slot = self._stored_slot(barber_id, slot)
+            if stored_slot is None:
+                return {"success": False, "error": "That time slot is no longer available"}
+            
+            error = self._reservation_error(await self.repository.areserve_slot(barber_id, stored_slot))
+            if error:
+                return error
+            
+            # SQLite write; kept off the event loop
+            booking_ref = await asyncio.to_thread(
+                booking_outbox.enqueue, booking_data, self.n8n_webhook_url, WEBHOOK_USER_AGENT
+            )
+            return self._booking_success(booking_ref)
             
         except Exception as e:
             logger.error(f"Error booking appointment: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def calendar_status(self, booking_ref: str) -> Optional[Dict[str, Any]]:
+        """Google Calendar status of a queued booking"""
+        return booking_outbox.status(booking_ref)
+
     # ---------- RAG Knowledge Base ----------
     def build_knowledge_base(self) -> str:
-        """Build knowledge base from barber data"""
-        barbers = self.get_barbers_data()
-        
-        knowledge = "BARBER SALON INFORMATION:\n\n"
-        
-        for barber in barbers:
-            knowledge += f"Barber ID: {barber['id']}\n"
-            knowledge += f"Barber Name: {barber['name']}\n"
-            
-            # Services
-            services = self.get_barber_services(barber['id'])
-            knowledge += f"Services: {', '.join(services)}\n"
-            
-            # Available slots
-            slots = self.get_available_slots(barber['id'])
-            knowledge += f"Available Slots: {', '.join(slots[:10])}{'...' if len(slots) > 10 else ''}\n"
-            knowledge += "---\n"
-        
-        return knowledge
+        """Build knowledge base from barber data (cached per snapshot version)"""
+        try:
+            return knowledge_base.render(self.get_snapshot())
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
+            return KNOWLEDGE_BASE_HEADER
+
+    def retrieve_knowledge(self, user_input: str, context: Dict[str, Any]) -> str:
+        """Retrieve only the barber/slot fragments relevant to this turn"""
+        try:
+            fragments = retrieval_index(self.get_snapshot()).retrieve(user_input, context)
+            return render_fragments(fragments) + self.earliest_openings_text(user_input, context)
+        except Exception as e:
+            logger.error(f"Error retrieving salon data: {str(e)}")
+            return self.build_knowledge_base()
+
+    def earliest_openings_text(self, user_input: str, context: Dict[str, Any]) -> str:
+        """Merged soonest openings when the user asks who is free first (empty otherwise)"""
+        if not asks_for_earliest(user_input):
+            return ""
+        matcher = self.get_mention_matcher()
+        mentioned = [m.value for m in matcher.find(user_input) if m.kind == "service"] if matcher else []
+        key = mentioned[0] if mentioned else normalize_name(context.get("selected_service"))
+        service = self.get_directory().service_names.get(key) if key else None
+        return "\n" + render_openings(self.find_earliest_slots(service), service)
+
+    def build_prompt_parts(self, user_input: str, context: Dict[str, Any]) -> PromptParts:
+        """Split the prompt into static prefix, salon data block and per-turn suffix"""
+        return PromptParts(
+            STATIC_INSTRUCTIONS,
+            render_data_block(self.retrieve_knowledge(user_input, context)),
+            render_turn_suffix(user_input, context)
+        )
 
     def create_dynamic_prompt(self, user_input: str, context: Dict[str, Any]) -> str:
         """Create dynamic prompt based on context and user input"""
-        
-        knowledge_base = self.build_knowledge_base()
-        
-        # Determine current booking step and create appropriate prompt
-        booking_step = context.get('booking_step', 'initial')
-        
-        system_prompt = f"""
-You are a friendly and helpful AI barber salon assistant. Your job is to help customers find barbers, services, and book appointments efficiently.
-
-CURRENT SALON DATA:
-{knowledge_base}
-
-CURRENT BOOKING CONTEXT:
-- Booking Step: {booking_step}
-- Selected Barber: {context.get('selected_barber', 'None')} (ID: {context.get('selected_barber_id', 'None')})
-- Selected Service: {context.get('selected_service', 'None')}
-- Selected Slot: {context.get('selected_slot', 'None')}
-- Customer Name: {context.get('customer_name', 'None')}
-- Customer Phone: {context.get('customer_phone', 'None')}
-- Customer Email: {context.get('customer_email', 'None')}
-
-CRITICAL BOOKING FLOW RULES:
-1. NEVER repeat information that has already been confirmed
-2. NEVER ask for the same information twice
-3. Move forward in the booking process, don't go backwards
-4. When user provides all required info (barber, service, slot, name, phone, email), proceed to confirmation
-5. DO NOT show available slots again if a slot has already been selected
-6. Appointments will be automatically added to Google Calendar upon confirmation
-7. ALWAYS ask for NAME, PHONE NUMBER, AND EMAIL ADDRESS together when collecting customer details - say "I'll need your full name, phone number, and email address"
-8. EMAIL ADDRESS is REQUIRED - never proceed to booking without collecting the customer's email
-
-BOOKING PROCESS STEPS:
-1. initial - User asking general questions or starting conversation
-2. barber_selected - User has chosen a barber, show services
-3. service_selected - User has chosen a service, show available slots
-4. slot_selected - User has chosen a time slot, ask for name, phone number, AND email address (all three together)
-5. collecting_details - Currently collecting customer information (name, phone, email)
-6. details_complete - All info collected, ask for final confirmation
-7. confirming_booking - Final confirmation before booking (will create Google Calendar event)
-
-RESPONSE GUIDELINES:
-- Be conversational and friendly like a salon receptionist
-- Use emojis sparingly (1-2 per response maximum)
-- Keep responses concise and clear
-- Always acknowledge what the user has already provided
-- Guide them to the next step smoothly
-- Mention that appointments will be added to Google Calendar
-- If all booking details are complete, ask for confirmation to book
-
-CURRENT STEP SPECIFIC INSTRUCTIONS:
-- If booking_step is "initial": Help user choose a barber or show all barbers
-- If booking_step is "barber_selected": Show services for selected barber
-- If booking_step is "service_selected": Show available time slots for the barber
-- If booking_step is "slot_selected": Ask for all three: "I'll need your full name, phone number, and email address to complete the booking"
-- If booking_step is "collecting_details": Continue collecting missing information (name, phone, email) - mention what's still needed
-- If booking_step is "details_complete": Show booking summary and ask for confirmation (mention Google Calendar)
-- If all details are provided but not yet confirmed: Ask "Shall I confirm this booking and add it to Google Calendar?"
-
-CUSTOMER DETAILS COLLECTION:
-When in "slot_selected" step, you must ask for ALL THREE pieces of information at once:
-- Full name
-- Phone number  
-- Email address
-Say something like: "Perfect! I'll need your full name, phone number, and email address to complete the booking."
-
-EMAIL IS MANDATORY: Never proceed to booking without collecting a valid email address.
-
-CURRENT USER INPUT: {user_input}
-
-Provide a helpful response that moves the booking process forward efficiently:"""
-
-        return system_prompt
-
-    def extract_booking_info(self, user_input: str):
+        return self.build_prompt_parts(user_input, context).full_text()
+
+    def extract_booking_info(self, user_input: str, context: Optional[Dict[str, Any]] = None):
         """Extract booking information from user input and update context"""
-        user_input_lower = user_input.lower()
+        context = self.context if context is None else context
+        info = extract_entities(user_input, self.get_mention_matcher())
+        collecting = ["slot_selected", "collecting_details"]
         
-        # Extract barber ID or name
-        id_match = re.search(r'\bid\s*(\d+)', user_input_lower)
-        if id_match:
-            barber_id = int(id_match.group(1))
-            barber = self.get_barber_by_id(barber_id)
+        # Barber changes only make sense before a slot is picked for them
+        if not context.get("selected_slot"):
+            # Extract barber ID or name (a name mention overrides "id N")
+            barber = None
+            if info.barber_id is not None:
+                barber = self.get_barber_by_id(info.barber_id)
+            if info.barbers:
+                barber = self.get_barber_by_id(info.barbers[0])
             if barber:
-                self.context["selected_barber_id"] = barber_id
-                self.context["selected_barber"] = barber["name"]
-                if self.context["booking_step"] == "initial":
-                    self.context["booking_step"] = "barber_selected"
-        
-        # Check for barber names
-        barbers = self.get_barbers_data()
-        for barber in barbers:
-            if barber["name"].lower() in user_input_lower:
-                self.context["selected_barber"] = barber["name"]
-                self.context["selected_barber_id"] = barber["id"]
-                if self.context["booking_step"] == "initial":
-                    self.context["booking_step"] = "barber_selected"
-                break
+                context["selected_barber_id"] = barber["id"]
+                context["selected_barber"] = barber["name"]
+                if context["booking_step"] == "initial":
+                    context["booking_step"] = "barber_selected"
         
         # Extract service selection
-        if self.context.get("selected_barber_id") and not self.context.get("selected_service"):
-            available_services = self.get_barber_services(self.context["selected_barber_id"])
-            for service in available_services:
-                if service.lower() in user_input_lower:
-                    self.context["selected_service"] = service
-                    self.context["booking_step"] = "service_selected"
-                    break
-        
-        # Extract time slot selection - improved pattern matching
-        if self.context.get("selected_barber_id") and not self.context.get("selected_slot"):
-            # Look for date and time patterns
-            datetime_patterns = [
-                r'(\d{4}-\d{2}-\d{2}\s+(?:at\s+)?\d{1,2}:\d{2}\s+[AaPp][Mm])',
-                r'(\d{4}-\d{2}-\d{2}\s+\d{1,2}:\d{2}\s+[AaPp][Mm])',
-                r'(\d{4}-\d{1,2}-\d{1,2}\s+(?:at\s+)?\d{1,2}:\d{2}\s+[AaPp][Mm])'
-            ]
-            
-            for pattern in datetime_patterns:
-                datetime_match = re.search(pattern, user_input, re.IGNORECASE)
-                if datetime_match:
-                    selected_slot = datetime_match.group(1).strip()
-                    # Normalize the format
-                    selected_slot = re.sub(r'\s+at\s+', ' ', selected_slot, flags=re.IGNORECASE)
-                    
-                    # Check if this slot is available for the selected barber
-                    available_slots = self.get_available_slots(self.context["selected_barber_id"])
-                    if selected_slot in available_slots:
-                        self.context["selected_slot"] = selected_slot
-                        self.context["booking_step"] = "slot_selected"
-                        break
-        
-        # Extract customer name - improved patterns
-        if self.context["booking_step"] in ["slot_selected", "collecting_details"] and not self.context.get("customer_name"):
-            name_patterns = [
-                r'name[:\s]+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
-                r'my name is\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
-                r'i am\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
-                r'name\s+([A-Za-z]+(?:\s+[A-Za-z]+)*)',
-                r'^([A-Za-z]+)\s*,',  # Name at start followed by comma
-            ]
-            
-            for pattern in name_patterns:
-                match = re.search(pattern, user_input_lower)
-                if match:
-                    self.context["customer_name"] = match.group(1).title()
+        if context.get("selected_barber_id") and not context.get("selected_service"):
+            available_services = {
+                normalize_name(service): service
+                for service in self.get_barber_services(context["selected_barber_id"])
+            }
+            for service_key in info.services:
+                if service_key in available_services:
+                    context["selected_service"] = available_services[service_key]
+                    context["booking_step"] = "service_selected"
                     break
         
-        # Extract phone numbers
-        if self.context["booking_step"] in ["slot_selected", "collecting_details"] and not self.context.get("customer_phone"):
-            phone_patterns = [
-                r'phone(?:\s+number)?[:\s]*(\d+)',
-                r'number[:\s]*(\d+)',
-                r'(\d{10,})',  # Any 10+ digit number
-            ]
-            
-            for pattern in phone_patterns:
-                phone_match = re.search(pattern, user_input)
-                if phone_match:
-                    phone_number = phone_match.group(1)
-                    if len(phone_number) >= 10:  # Valid phone number
-                        self.context["customer_phone"] = phone_number
-                        break
+        # Extract time slot selection
+        if info.slot and context.get("selected_barber_id") and not context.get("selected_slot"):
+            # Check if this slot is available for the selected barber
+            slot_key = self.get_slot_index(context["selected_barber_id"]).find_display(info.slot)
+            if slot_key is not None:
+                context["selected_slot"] = format_slot_key(slot_key)
+                context["booking_step"] = "slot_selected"
         
-        # Extract email address
-        if self.context["booking_step"] in ["slot_selected", "collecting_details"] and not self.context.get("customer_email"):
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            email_match = re.search(email_pattern, user_input)
-            if email_match:
-                self.context["customer_email"] = email_match.group(0)
+        # Extract customer details
+        if context["booking_step"] in collecting:
+            # Name phrases are only trusted while collecting details, as before
+            if info.name and not context.get("customer_name"):
+                context["customer_name"] = info.name
+            if info.phone and not context.get("customer_phone"):
+                context["customer_phone"] = info.phone
+            if info.email and not context.get("customer_email"):
+                context["customer_email"] = info.email
         
         # Update booking step logic
-        if self.context["booking_step"] == "slot_selected":
+        if context["booking_step"] == "slot_selected":
             # Move to collecting_details if we don't have all info yet
-            if not (self.context.get("customer_name") and 
-                   self.context.get("customer_phone") and
-                   self.context.get("customer_email")):
-                self.context["booking_step"] = "collecting_details"
+            if not (context.get("customer_name") and 
+                   context.get("customer_phone") and
+                   context.get("customer_email")):
+                context["booking_step"] = "collecting_details"
         
         # Update booking step when all details are collected
-        if (self.context.get("customer_name") and 
-            self.context.get("customer_phone") and
-            self.context.get("customer_email") and
-            self.context.get("selected_slot") and 
-            self.context.get("selected_service") and 
-            self.context.get("selected_barber_id")):
-            
-            if self.context["booking_step"] in ["slot_selected", "collecting_details"]:
-                self.context["booking_step"] = "details_complete"
+        if (context.get("customer_name") and 
+            context.get("customer_phone") and
+            context.get("customer_email") and
+            context.get("selected_slot") and 
+            context.get("selected_service") and 
+            context.get("selected_barber_id")):
+            
+            if context["booking_step"] in ["slot_selected", "collecting_details"]:
+                context["booking_step"] = "details_complete"
 
     # ---------- AI-Powered Response Generation ----------
-    def generate_response(self, user_input: str) -> str:
+    def _start_turn(self, user_input: str, context: Dict[str, Any]) -> bool:
+        """Record the user turn and update context; True if the user is confirming the booking"""
+        # Add user input to conversation history
+        context["conversation_history"].append(f"User: {user_input}")
+        
+        # Extract booking information from user input
+        self.extract_booking_info(user_input, context)
+        
+        # Handle booking confirmation - check for confirmation keywords
+        if context["booking_step"] == "details_complete":
+            confirmation_keywords = ["yes", "confirm", "book", "proceed", "ok", "sure", "please"]
+            return any(keyword in user_input.lower() for keyword in confirmation_keywords)
+        return False
+
+    def _booking_args(self, context: Dict[str, Any]) -> tuple:
+        """book_appointment() arguments taken from the context"""
+        return (
+            context["selected_barber_id"],
+            context["selected_service"],
+            context["selected_slot"],
+            context["customer_name"],
+            context["customer_phone"],
+            context["customer_email"]
+        )
+
+    def _booking_reply(self, booking_result: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Confirmation or failure message for a booking attempt"""
+        if booking_result["success"]:
+            calendar_info = ""
+            if booking_result.get("calendar_event_id"):
+                calendar_info = f"\n\n📅 Google Calendar: Your appointment has been added to Google Calendar!"
+                if booking_result.get("calendar_link"):
+                    calendar_info += f"\n🔗 Calendar Link: {booking_result['calendar_link']}"
+            elif booking_result.get("calendar_status") == PENDING:
+                calendar_info = f"\n\n📅 Google Calendar: Your calendar invite is being created and will be sent to {context['customer_email']} shortly."
+            
+            response = f"🎉 Perfect! Your appointment has been successfully booked!\n\n📅 Booking Confirmation:\n- Barber: {context['selected_barber']}\n- Service: {context['selected_service']}\n- Date & Time: {context['selected_slot']}\n- Customer: {context['customer_name']}\n- Phone: {context['customer_phone']}\n- Email: {context['customer_email']}"
+            
+            response += calendar_info + "\n\nWe look forward to seeing you! 💇‍♂️"
+            
+            context["calendar_event_id"] = booking_result.get("calendar_event_id")
+            context["booking_ref"] = booking_result.get("booking_ref")
+            context["booking_confirmed"] = True
+            context["booking_step"] = "completed"
+        else:
+            error_msg = booking_result.get("error", "Unknown error occurred")
+            response = f"❌ Sorry, there was an issue booking your appointment: {error_msg}. Please try again or contact us directly."
+            context["booking_failed"] = True
+        
+        # Add response to history and return
+        context["conversation_history"].append(f"Assistant: {response}")
+        return response
+
+    def _templated_reply(self, context: Dict[str, Any]) -> Optional[str]:
+        """Template reply when the turn doesn't need the LLM"""
+        # Summary and detail requests depend only on the context - skip the LLM
+        templated = self.responder.respond(context)
+        if templated is not None:
+            return self._finish_turn(templated, context)
+        return None
+
+    def _begin_turn(self, user_input: str, context: Dict[str, Any]) -> Optional[str]:
+        """Record the user turn and update context; returns the reply if no LLM call is needed"""
+        if self._start_turn(user_input, context):
+            return self._booking_reply(self.book_appointment(*self._booking_args(context)), context)
+        return self._templated_reply(context)
+
+    async def _abegin_turn(self, user_input: str, context: Dict[str, Any]) -> Optional[str]:
+        """Async _begin_turn(): books through abook_appointment()"""
+        try:
+            await self.aget_snapshot()
+        except Exception as e:
+            logger.error(f"Error fetching barbers: {str(e)}")
+        if self._start_turn(user_input, context):
+            result = await self.abook_appointment(*self._booking_args(context))
+            # The reservation invalidated the snapshot; fetch the new one before the reply reads it
+            try:
+                await self.aget_snapshot()
+            except Exception as e:
+                logger.error(f"Error fetching barbers: {str(e)}")
+            return self._booking_reply(result, context)
+        return self._templated_reply(context)
+
+    def _response_cache_key(self, user_input: str, context: Dict[str, Any]) -> Optional[str]:
+        """Response cache key for this turn; None when the salon data is unavailable"""
+        if asks_for_earliest(user_input):
+            # "Soonest" answers depend on the current time, not just on the salon data
+            return None
+        try:
+            return make_cache_key(user_input, context, self.get_snapshot().fingerprint)
+        except Exception as e:
+            logger.warning(f"Response cache bypassed: {str(e)}")
+            return None
+
+    def _finish_turn(self, ai_response: str, context: Dict[str, Any]) -> str:
+        """Record the assistant reply in conversation history"""
+        context["conversation_history"].append(f"Assistant: {ai_response}")
+        
+        # Keep only last 20 exchanges in history
+        if len(context["conversation_history"]) > 20:
+            context["conversation_history"] = context["conversation_history"][-20:]
+        
+        return ai_response
+
+    def generate_response(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> str:
         """Generate AI-powered response using RAG approach"""
+        context = self.context if context is None else context
         try:
-            # Add user input to conversation history
-            self.context["conversation_history"].append(f"User: {user_input}")
+            handled = self._begin_turn(user_input, context)
+            if handled is not None:
+                return handled
             
-            # Extract booking information from user input
-            self.extract_booking_info(user_input)
-            
-            # Handle booking confirmation - check for confirmation keywords
-            if self.context["booking_step"] == "details_complete":
-                confirmation_keywords = ["yes", "confirm", "book", "proceed", "ok", "sure", "please"]
-                if any(keyword in user_input.lower() for keyword in confirmation_keywords):
-                    # Attempt to book the appointment
-                    booking_result = self.book_appointment(
-                        self.context["selected_barber_id"],
-                        self.context["selected_service"],
-                        self.context["selected_slot"],
-                        self.context["customer_name"],
-                        self.context["customer_phone"],
-                        self.context["customer_email"]
-                    )
-                    
-                    if booking_result["success"]:
-                        calendar_info = ""
-                        if booking_result.get("calendar_event_id"):
-                            calendar_info = f"\n\n📅 Google Calendar: Your appointment has been added to Google Calendar!"
-                            if booking_result.get("calendar_link"):
-                                calendar_info += f"\n🔗 Calendar Link: {booking_result['calendar_link']}"
-                        
-                        response = f"🎉 Perfect! Your appointment has been successfully booked and added to Google Calendar!\n\n📅 Booking Confirmation:\n- Barber: {self.context['selected_barber']}\n- Service: {self.context['selected_service']}\n- Date & Time: {self.context['selected_slot']}\n- Customer: {self.context['customer_name']}\n- Phone: {self.context['customer_phone']}\n- Email: {self.context['customer_email']}"
-                        
-                        response += calendar_info + "\n\nWe look forward to seeing you! 💇‍♂️"
-                        
-                        self.context["booking_confirmed"] = True
-                        self.context["booking_step"] = "completed"
-                    else:
-                        error_msg = booking_result.get("error", "Unknown error occurred")
-                        response = f"❌ Sorry, there was an issue booking your appointment: {error_msg}. Please try again or contact us directly."
-                        self.context["booking_failed"] = True
-                    
-                    # Add response to history and return
-                    self.context["conversation_history"].append(f"Assistant: {response}")
-                    return response
+            # Same question, same booking context, same salon data -> same answer
+            cache_key = self._response_cache_key(user_input, context)
+            if cache_key:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    return self._finish_turn(cached, context)
             
             # Create dynamic prompt with all context
-            prompt = self.create_dynamic_prompt(user_input, self.context)
+            prompt = self.build_prompt_parts(user_input, context)
             
-            # Generate response using Gemini
-            response = self.model.generate_content(prompt)
+            # Generate response using Gemini, reusing the cached static prefix
+            response = prefix_cache.model_for(prompt.prefix).generate_content(prompt.user_content())
             ai_response = response.text.strip()
+            if cache_key and ai_response:
+                response_cache.put(cache_key, ai_response)
+            return self._finish_turn(ai_response, context)
             
-            # Add specific step-based enhancements
-            if self.context["booking_step"] == "details_complete":
-                # Show summary and ask for confirmation
-                ai_response = f"Perfect! I have all the details for your appointment:\n\n📋 Booking Summary:\n- Barber: {self.context['selected_barber']}\n- Service: {self.context['selected_service']}\n- Time: {self.context['selected_slot']}\n- Name: {self.context['customer_name']}\n- Phone: {self.context['customer_phone']}\n- Email: {self.context['customer_email']}\n\n📅 Your appointment will be automatically added to Google Calendar upon confirmation.\n\nShall I confirm this booking for you? Just say 'yes' or 'confirm' to proceed! ✅"
-            
-            # Ensure we always ask for name, phone and email together when details are missing
-            if self.context.get("booking_step") in ["slot_selected", "collecting_details"]:
-                missing = []
-                if not self.context.get("customer_name"):
-                    missing.append("full name")
-                if not self.context.get("customer_phone"):
-                    missing.append("phone number")
-                if not self.context.get("customer_email"):
-                    missing.append("email address")
-                if missing:
-                    if len(missing) == 3:
-                        ask = "your full name, phone number, and email address"
-                    elif len(missing) == 2:
-                        ask = f"your {missing[0]} and {missing[1]}"
-                    else:
-                        ask = f"your {missing[0]}"
-                    ai_response = (
-                        "Perfect! To complete your booking, please provide " + ask + ".\n"
-                        "Example: 'Name Ali, phone 03001234567, email ali@example.com'"
-                    )
-            
-            # Add AI response to conversation history
-            self.context["conversation_history"].append(f"Assistant: {ai_response}")
-            
-            # Keep only last 20 exchanges in history
-            if len(self.context["conversation_history"]) > 20:
-                self.context["conversation_history"] = self.context["conversation_history"][-20:]
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            return f"I apologize, but I'm having trouble processing your request right now. Please try asking: 'show all barbers' or 'help me book an appointment'. Error: {str(e)}"
+
+    def generate_response_stream(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Generate a response like generate_response, yielding text chunks as Gemini produces them"""
+        context = self.context if context is None else context
+        try:
+            handled = self._begin_turn(user_input, context)
+            if handled is not None:
+                yield handled
+                return
+            
+            cache_key = self._response_cache_key(user_input, context)
+            if cache_key:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    yield self._finish_turn(cached, context)
+                    return
+            
+            prompt = self.build_prompt_parts(user_input, context)
+            model = prefix_cache.model_for(prompt.prefix)
+            
+            chunks = []
+            for chunk in model.generate_content(prompt.user_content(), stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. safety metadata only)
+                    continue
+                if text:
+                    chunks.append(text)
+                    yield text
+            
+            ai_response = "".join(chunks).strip()
+            if cache_key and ai_response:
+                response_cache.put(cache_key, ai_response)
+            self._finish_turn(ai_response, context)
             
-            return ai_response
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            yield f"I apologize, but I'm having trouble processing your request right now. Please try asking: 'show all barbers' or 'help me book an appointment'. Error: {str(e)}"
+
+    async def agenerate_response(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Async generate_response(): Supabase, Gemini and n8n I/O never block the event loop"""
+        context = self.context if context is None else context
+        pinned = _turn_snapshot.set({})
+        try:
+            handled = await self._abegin_turn(user_input, context)
+            if handled is not None:
+                return handled
+            
+            # The response cache (SQLite) and model_for (which may create a
+            # Gemini context cache over the network) block, so run them in threads
+            cache_key = self._response_cache_key(user_input, context)
+            if cache_key:
+                cached = await asyncio.to_thread(response_cache.get, cache_key)
+                if cached is not None:
+                    return self._finish_turn(cached, context)
+            
+            prompt = self.build_prompt_parts(user_input, context)
+            model = await asyncio.to_thread(prefix_cache.model_for, prompt.prefix)
+            response = await model.generate_content_async(prompt.user_content())
+            ai_response = response.text.strip()
+            if cache_key and ai_response:
+                await asyncio.to_thread(response_cache.put, cache_key, ai_response)
+            return self._finish_turn(ai_response, context)
             
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return f"I apologize, but I'm having trouble processing your request right now. Please try asking: 'show all barbers' or 'help me book an appointment'. Error: {str(e)}"
+        finally:
+            _turn_snapshot.reset(pinned)
+
+    async def aclose(self):
+        """Close the async webhook connection pool"""
+        await self.webhook.aclose()
 
     # ---------- Reset ----------
-    def reset_conversation(self):
-        """Reset conversation context"""
-        self.context = {
-            "booking_step": "initial",
-            "selected_barber": None,
-            "selected_barber_id": None,
-            "selected_service": None,
-            "selected_slot": None,
-            "customer_name": None,
-            "customer_phone": None,
-            "customer_email": None,
-            "booking_confirmed": False,
-            "booking_failed": False,
-            "calendar_event_id": None,
-            "conversation_history": []
-        }
-        self.barbers_cache = None  # Clear cache
+    def reset_conversation(self, context: Optional[Dict[str, Any]] = None):
+        """Reset conversation context (the default one, or the given session's in place)"""
+        if context is None:
+            self.context = new_conversation_context()
+        else:
+            context.clear()
+            context.update(new_conversation_context())
         logger.info("Conversation context has been reset.")
\ No newline at end of file
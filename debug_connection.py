@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from supabase_backend import create_client
+from barber_repository import BarberRepository
 
 # Load environment variables
 load_dotenv()
@@ -15,13 +17,13 @@ def test_with_correct_table_name():
         supabase: Client = create_client(supabase_url, supabase_key)
         print("✅ Supabase client created successfully")
         
-        # Test with correct table name (capital B)
-        response = supabase.table('Barber_bookings').select("*").execute()
+        # Same queries and normalization as the chatbot and the API
+        barbers = BarberRepository(supabase).list_barbers()
         
-        if response.data:
-            print(f"🎉 SUCCESS! Found {len(response.data)} records in 'Barber_bookings' table")
+        if barbers:
+            print(f"🎉 SUCCESS! Found {len(barbers)} records in 'Barber_bookings' table")
             print("\nSample data:")
-            for i, record in enumerate(response.data[:3]):
+            for i, record in enumerate(barbers[:3]):
                 print(f"  Record {i+1}: {record}")
             return True
         else:
@@ -1,32 +1,86 @@
 # endpoints.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel, EmailStr
-from supabase import create_client
+from supabase_backend import create_client, uses_local_backend
 from dotenv import load_dotenv
 import os
 from datetime import datetime
-from typing import List, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, FrozenSet, Tuple, TypeVar
+import base64
+import functools
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
 import logging
 import requests
+import anyio
+from webhook_client import webhook_client_for
+from api_responses import FastJSONResponse, add_compression
+from booking_outbox import booking_outbox
+from slot_reservation import TAKEN, NOT_FOUND
+from barber_cache import BarberSnapshot
+from barber_repository import BarberRepository, snapshot_page
+from barber_directory import split_services
+from slots import SlotIndex, parse_display, format_slot_key, key_date, date_bounds
+from availability_search import earliest_openings, DEFAULT_LIMIT
+from slots_table import use_slots_table
 
 load_dotenv(".env1")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if not uses_local_backend() and (not SUPABASE_URL or not SUPABASE_KEY):
     raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment")
 
-app = FastAPI(title="Barber Salon API", version="1.0.0")
+app = FastAPI(title="Barber Salon API", version="1.0.0", default_response_class=FastJSONResponse)
+add_compression(app)
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+repository = BarberRepository(supabase)
 
 # N8N Webhook URL
 N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
 if not N8N_WEBHOOK_URL:
     raise RuntimeError("Missing N8N_WEBHOOK_URL in environment (.env1)")
+WEBHOOK_USER_AGENT = "BarberSalonAPI/1.0"
+webhook = webhook_client_for(N8N_WEBHOOK_URL, WEBHOOK_USER_AGENT)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("endpoints")
 
+# The supabase client and the webhook call are blocking, so handlers run them
+# on worker threads. Each gets its own bounded pool: a backlog of slow webhook
+# calls can then never starve database reads (or the event loop itself).
+DB_CONCURRENCY = int(os.getenv("API_DB_CONCURRENCY", "20"))
+WEBHOOK_CONCURRENCY = int(os.getenv("API_WEBHOOK_CONCURRENCY", "10"))
+db_limiter = anyio.CapacityLimiter(DB_CONCURRENCY)
+webhook_limiter = anyio.CapacityLimiter(WEBHOOK_CONCURRENCY)
+
+# Keys a barber object has; ?fields= picks a subset
+BARBER_FIELDS = frozenset({
+    "id", "name", "services", "services_list",
+    "available_slots_raw", "available_slots_formatted", "total_slots"
+})
+
+# Largest page GET /barbers will return
+MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "100"))
+# Seconds clients may reuse a read response before revalidating (0 = always revalidate)
+CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "0"))
+# Limits on one POST /availability/batch request
+MAX_BATCH_BARBERS = int(os.getenv("API_MAX_BATCH_BARBERS", "100"))
+MAX_BATCH_DAYS = int(os.getenv("API_MAX_BATCH_DAYS", "31"))
+
+T = TypeVar("T")
+
+
+async def run_db(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking Supabase call on the database thread pool"""
+    return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=db_limiter)
+
+
+async def run_webhook(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking webhook call on the webhook thread pool"""
+    return await anyio.to_thread.run_sync(functools.partial(func, *args), limiter=webhook_limiter)
+
 
 # Pydantic models for request/response
 class BookingRequest(BaseModel):
@@ -41,76 +95,27 @@ class BookingResponse(BaseModel):
     success: bool
     message: str
     booking_id: Optional[int] = None
+    booking_ref: Optional[str] = None
+    calendar_status: Optional[str] = None
     calendar_event_id: Optional[str] = None
     calendar_link: Optional[str] = None
 
+class AvailabilityBatchRequest(BaseModel):
+    barber_ids: List[int]
+    date_from: str
+    date_to: str
+
 class N8NWebhookPayload(BaseModel):
     event_type: str
     booking_details: dict
     calendar_event: dict
 
 
-def _parse_ts_item(item: Any) -> str:
-    """Parse timestamp item to readable string"""
-    if not item:
-        return ""
-    try:
-        s = str(item)
-        if s.endswith("Z"):
-            s = s.replace("Z", "+00:00")
-        dt = datetime.fromisoformat(s)
-        return dt.strftime("%Y-%m-%d %I:%M %p")
-    except Exception:
-        return str(item)
-
-
 def call_n8n_webhook(booking_data: dict) -> dict:
     """Call n8n webhook to create booking and Google Calendar event"""
     try:
         logger.info(f"Calling n8n webhook with booking data")
-        
-        # Prepare payload for n8n webhook
-        webhook_payload = {
-            "event_type": "booking_created",
-            "booking_details": {
-                "barber_id": booking_data["barber_id"],
-                "barber_name": booking_data["barber_name"],
-                "service": booking_data["service"],
-                "appointment_time": booking_data["appointment_time"],
-                "customer_name": booking_data["customer_name"],
-                "customer_phone": booking_data["customer_phone"],
-                "customer_email": booking_data.get("customer_email", ""),
-                "status": "confirmed",
-                "created_at": datetime.now().isoformat(),
-                "salon_name": "AI Barber Salon",
-                "notes": f"Booking for {booking_data['service']} with {booking_data['barber_name']}"
-            },
-            "calendar_event": {
-                "summary": f"Barber Appointment - {booking_data['service']}",
-                "description": f"Customer: {booking_data['customer_name']}\nPhone: {booking_data['customer_phone']}\nEmail: {booking_data['customer_email']}\nService: {booking_data['service']}\nBarber: {booking_data['barber_name']}\nSalon: AI Barber Salon",
-                "start_time": booking_data["appointment_time"],
-                "duration_minutes": 60,  # Default 1 hour appointment
-                "attendees": [booking_data.get("customer_email", "")] if booking_data.get("customer_email") else [],
-                "location": "AI Barber Salon"
-            }
-        }
-        
-        # Make the API call to n8n webhook
-        response = requests.post(
-            N8N_WEBHOOK_URL,
-            json=webhook_payload,
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "BarberSalonAPI/1.0"
-            },
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        
-        # Parse response
-        result = response.json() if response.content else {}
-        logger.info(f"n8n webhook response: {result}")
+        result = webhook.send_booking(booking_data)
         
         return {
             "success": True,
@@ -134,82 +139,231 @@ def call_n8n_webhook(booking_data: dict) -> dict:
         }
 
 
+async def _get_snapshot() -> BarberSnapshot:
+    """Get the barber snapshot shared with the chatbot (refreshed off the event loop)"""
+    return await repository.asnapshot(lambda: run_db(repository.list_barbers))
+
+
+def _format_barber(barber: dict, slots: SlotIndex, start: Optional[int] = None, end: Optional[int] = None,
+                   slot_limit: Optional[int] = None, fields: Optional[FrozenSet[str]] = None,
+                   slot_total: Optional[int] = None) -> dict:
+    """Format a barber record for API responses, optionally limited to slots in [start, end).
+    
+    With fields, only those keys are built (slot lists are the costly part).
+    slot_total overrides total_slots when slots holds only the first slot_limit.
+    """
+    def wanted(field: str) -> bool:
+        return fields is None or field in fields
+    
+    formatted_barber = {}
+    if wanted("id"):
+        formatted_barber["id"] = barber["id"]
+    if wanted("name"):
+        formatted_barber["name"] = barber["name"]
+    if wanted("services"):
+        formatted_barber["services"] = barber["services"]
+    if wanted("services_list"):
+        formatted_barber["services_list"] = list(split_services(barber["services"]))
+    
+    if start is None and end is None:
+        total = len(slots)
+        if wanted("available_slots_raw"):
+            formatted_barber["available_slots_raw"] = slots.raw_slots()[:slot_limit]
+        if wanted("available_slots_formatted"):
+            formatted_barber["available_slots_formatted"] = slots.formatted()[:slot_limit]
+    else:
+        keys = slots.between(start, end)
+        total = len(keys)
+        if wanted("available_slots_raw"):
+            formatted_barber["available_slots_raw"] = [slots.raw(k) for k in keys[:slot_limit]]
+        if wanted("available_slots_formatted"):
+            formatted_barber["available_slots_formatted"] = [format_slot_key(k) for k in keys[:slot_limit]]
+    if wanted("total_slots"):
+        formatted_barber["total_slots"] = total if slot_total is None else slot_total
+    return formatted_barber
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Sparse fieldset from ?fields=a,b (None means every field)"""
+    if not fields:
+        return None
+    requested = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = requested - BARBER_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available fields: {', '.join(sorted(BARBER_FIELDS))}"
+        )
+    return requested
+
+
+def _json(body: Any, response: Response) -> Response:
+    """Render body with the fast encoder directly (no re-validation), keeping headers set on response"""
+    rendered = FastJSONResponse(body)
+    for key, value in response.headers.items():
+        if key != "content-length":
+            rendered.headers.append(key, value)
+    return rendered
+
+
+def _weak_etag(key: str) -> str:
+    """Weak ETag for key; weak because one tag covers the identity, gzip and brotli bodies"""
+    return 'W/"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+
+def _snapshot_etag(snapshot: BarberSnapshot, request: Request) -> str:
+    """ETag for a response computed only from the snapshot and the request URL"""
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    return _weak_etag(f"{snapshot.fingerprint}|{request.url.path}|{query}")
+
+
+def _body_etag(body: Any) -> str:
+    """ETag from the response body, for responses read straight from the database"""
+    return _weak_etag(json.dumps(body, sort_keys=True, default=str))
+
+
+def _conditional(request: Request, response: Response, etag: str,
+                 last_modified: Optional[float] = None) -> Optional[Response]:
+    """Set ETag/Cache-Control/Last-Modified; return a 304 if the client's copy is still current"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"max-age={CACHE_MAX_AGE}, must-revalidate" if CACHE_MAX_AGE else "no-cache"
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        current = "*" in tags or etag.removeprefix("W/") in tags
+    else:
+        since = request.headers.get("if-modified-since")
+        try:
+            since_ts = parsedate_to_datetime(since).timestamp() if since else None
+        except (TypeError, ValueError):
+            since_ts = None
+        current = since_ts is not None and last_modified is not None and int(last_modified) <= since_ts
+    
+    if current:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _encode_cursor(barber_id: Any) -> str:
+    """Opaque cursor for the page after barber_id"""
+    return base64.urlsafe_b64encode(json.dumps({"after": barber_id}).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _date_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Slot key range [start, end) covering date_from through date_to (both inclusive, YYYY-MM-DD)"""
+    try:
+        start = date_bounds(date_from)[0] if date_from else None
+        end = date_bounds(date_to)[1] if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_from and date_to must be in YYYY-MM-DD format")
+    return start, end
+
+
+def _slots_by_date(slots: SlotIndex, start: int, end: int) -> Dict[str, List[dict]]:
+    """Slots in [start, end) grouped by YYYY-MM-DD, with every date in the range present"""
+    days = {key_date(day): [] for day in range(start, end, 24 * 60)}
+    for key in slots.between(start, end):
+        days[key_date(key)].append({"raw": slots.raw(key), "formatted": format_slot_key(key)})
+    return days
+
+
+@app.on_event("startup")
+async def start_booking_outbox():
+    """Deliver calendar webhooks queued before a restart"""
+    booking_outbox.start()
+
+
 @app.get("/")
 async def root():
     return {"message": "Barber Salon API is running", "version": "1.0.0"}
 
 
 @app.get("/barbers", response_model=List[dict])
-async def get_all_barbers():
-    """Get all barbers with formatted data"""
+async def get_all_barbers(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    service: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    available: bool = False,
+    slot_limit: Optional[int] = Query(None, ge=0),
+    fields: Optional[str] = None
+):
+    """Get barbers with formatted data, ordered by id.
+    
+    Filter by service, by slot dates (date_from/date_to) and to barbers with
+    open slots (available=true); cap slots per barber with slot_limit; pick
+    keys with fields=id,name,... With limit, the cursor for the next page is
+    in the X-Next-Cursor header.
+    """
     try:
-        res = supabase.table("Barber_bookings").select("*").execute()
-        if res.error:
-            logger.error("Supabase error: %s", res.error)
-            raise HTTPException(status_code=500, detail=str(res.error))
-        
-        rows = res.data or []
-        
-        # Format and normalize data
-        formatted_barbers = []
-        for r in rows:
-            # Find available slot key (case-insensitive)
-            available_slots_raw = []
-            for k in list(r.keys()):
-                if "available" in k.lower() and "slot" in k.lower():
-                    available_slots_raw = r.get(k) or []
-                    break
-            
-            # Format the barber data
-            formatted_barber = {
-                "id": r.get("id"),
-                "name": r.get("Barber", "").strip(),
-                "services": r.get("Services", ""),
-                "services_list": [s.strip() for s in str(r.get("Services", "")).split(",") if s.strip()],
-                "available_slots_raw": available_slots_raw,
-                "available_slots_formatted": [_parse_ts_item(x) for x in available_slots_raw],
-                "total_slots": len(available_slots_raw)
-            }
-            formatted_barbers.append(formatted_barber)
-        
-        return formatted_barbers
+        start, end = _date_range(date_from, date_to)
+        after_id = _decode_cursor(cursor)
+        selected = _parse_fields(fields)
+        
+        if use_slots_table():
+            # Every filter, including the slot range and slot_limit, runs in the database
+            count_slots = selected is None or "total_slots" in selected
+            page, next_after = await run_db(
+                repository.barbers_page, after_id, limit, service, start, end, available, slot_limit, count_slots
+            )
+            barbers = [
+                _format_barber(b, SlotIndex(b["slots"]), start, end, slot_limit, selected, b.get("slot_total"))
+                for b in page
+            ]
+            not_modified = _conditional(request, response, _body_etag(barbers))
+        else:
+            snapshot = await _get_snapshot()
+            page, next_after = snapshot_page(snapshot, after_id, limit, service, start, end, available)
+            not_modified = _conditional(request, response, _snapshot_etag(snapshot, request), snapshot.changed_at)
+            barbers = None if not_modified else [
+                _format_barber(b, snapshot.slot_index(b["id"]), start, end, slot_limit, selected) for b in page
+            ]
+        
+        if next_after is not None:
+            next_cursor = _encode_cursor(next_after)
+            headers = (not_modified or response).headers
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+        return not_modified or _json(barbers, response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error fetching barbers")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/barbers/{barber_id}")
-async def get_barber(barber_id: int):
-    """Get specific barber by ID"""
+async def get_barber(barber_id: int, request: Request, response: Response, fields: Optional[str] = None):
+    """Get specific barber by ID (optionally only the given fields)"""
     try:
-        res = supabase.table("Barber_bookings").select("*").eq("id", barber_id).execute()
-        
-        if res.error or not res.data:
-            logger.error("Supabase error: %s", res.error)
+        selected = _parse_fields(fields)
+        snapshot = await _get_snapshot()
+        barber = snapshot.directory.get(barber_id)
+        if not barber:
             raise HTTPException(status_code=404, detail="Barber not found")
         
-        row = res.data[0]
-        
-        # Find and format available slots
-        available_slots_raw = []
-        for k in list(row.keys()):
-            if "available" in k.lower() and "slot" in k.lower():
-                available_slots_raw = row.get(k) or []
-                break
-        
-        # Format the response
-        formatted_barber = {
-            "id": row.get("id"),
-            "name": row.get("Barber", "").strip(),
-            "services": row.get("Services", ""),
-            "services_list": [s.strip() for s in str(row.get("Services", "")).split(",") if s.strip()],
-            "available_slots_raw": available_slots_raw,
-            "available_slots_formatted": [_parse_ts_item(x) for x in available_slots_raw],
-            "total_slots": len(available_slots_raw)
-        }
-        
-        return formatted_barber
+        not_modified = _conditional(request, response, _snapshot_etag(snapshot, request), snapshot.changed_at)
+        return not_modified or _json(_format_barber(barber, snapshot.slot_index(barber_id), fields=selected), response)
         
     except HTTPException:
         raise
@@ -219,48 +373,50 @@ async def get_barber(barber_id: int):
 
 
 @app.get("/barbers/{barber_id}/availability")
-async def get_availability(barber_id: int, date: str = None):
+async def get_availability(barber_id: int, request: Request, response: Response, date: str = None):
     """Get availability for specific barber, optionally filtered by date"""
     try:
-        res = supabase.table("Barber_bookings").select("*").eq("id", barber_id).execute()
-        
-        if res.error or not res.data:
+        snapshot = await _get_snapshot()
+        barber = snapshot.directory.get(barber_id)
+        if not barber:
             raise HTTPException(status_code=404, detail="Barber not found")
         
-        row = res.data[0]
-        barber_name = row.get("Barber", "").strip()
-        
-        # Find available slots
-        raw_slots = []
-        for k in row.keys():
-            if "available" in k.lower() and "slot" in k.lower():
-                raw_slots = row.get(k) or []
-                break
+        barber_name = barber["name"]
+        slots = snapshot.slot_index(barber_id)
+        from_database = bool(date) and use_slots_table()
+        if not from_database:
+            not_modified = _conditional(request, response, _snapshot_etag(snapshot, request), snapshot.changed_at)
+            if not_modified:
+                return not_modified
         
         # Filter and format slots
-        filtered_slots = []
-        for s in raw_slots:
-            if date:
-                # Filter by date YYYY-MM-DD
-                try:
-                    st = str(s).replace("Z", "+00:00")
-                    dt = datetime.fromisoformat(st)
-                    if dt.strftime("%Y-%m-%d") != date:
-                        continue
-                except Exception:
-                    pass
-            filtered_slots.append({
-                "raw": s,
-                "formatted": _parse_ts_item(s)
-            })
-        
-        return {
+        if date:
+            # Filter by date YYYY-MM-DD with a range scan over the sorted keys
+            try:
+                bounds = date_bounds(date)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="date must be in YYYY-MM-DD format")
+            if from_database:
+                # Range query on the slots index; also covers dates beyond the snapshot horizon
+                slots = SlotIndex(await run_db(repository.available_slots, barber_id, *bounds))
+            keys = slots.between(*bounds)
+            filtered_slots = [{"raw": slots.raw(k), "formatted": format_slot_key(k)} for k in keys]
+        else:
+            filtered_slots = [
+                {"raw": raw, "formatted": formatted}
+                for raw, formatted in zip(slots.raw_slots(), slots.formatted())
+            ]
+        
+        availability = {
             "barber_id": barber_id,
             "barber_name": barber_name,
             "date_filter": date,
             "available_slots": filtered_slots,
             "total_available": len(filtered_slots)
         }
+        if from_database:
+            return _conditional(request, response, _body_etag(availability)) or _json(availability, response)
+        return _json(availability, response)
         
     except HTTPException:
         raise
@@ -269,46 +425,122 @@ async def get_availability(barber_id: int, date: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/availability/batch")
+async def get_availability_batch(batch: AvailabilityBatchRequest):
+    """Availability of several barbers over a date range, grouped by barber and date.
+    
+    Answers a week or month view in one request: the slots come from the shared
+    snapshot (or one slots-table query in table mode) and each barber's slots
+    are parsed once, however many dates are asked for.
+    """
+    try:
+        barber_ids = list(dict.fromkeys(batch.barber_ids))
+        if not barber_ids:
+            raise HTTPException(status_code=400, detail="barber_ids must not be empty")
+        if len(barber_ids) > MAX_BATCH_BARBERS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_BARBERS} barbers per request")
+        start, end = _date_range(batch.date_from, batch.date_to)
+        if start is None or end is None:
+            raise HTTPException(status_code=400, detail="date_from and date_to are required")
+        days = (end - start) // (24 * 60)
+        if days < 1:
+            raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+        if days > MAX_BATCH_DAYS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DAYS} days per request")
+        
+        snapshot = await _get_snapshot()
+        found = [snapshot.directory.get(barber_id) for barber_id in barber_ids]
+        found = [barber for barber in found if barber]
+        if use_slots_table():
+            # One range query for every barber; also covers dates beyond the snapshot horizon
+            open_slots = await run_db(repository.available_slots_for, [b["id"] for b in found], start, end)
+            indexes = {b["id"]: SlotIndex(open_slots.get(b["id"], [])) for b in found}
+        else:
+            indexes = {b["id"]: snapshot.slot_index(b["id"]) for b in found}
+        
+        barbers = []
+        for barber in found:
+            availability = _slots_by_date(indexes[barber["id"]], start, end)
+            barbers.append({
+                "barber_id": barber["id"],
+                "barber_name": barber["name"],
+                "availability": availability,
+                "total_available": sum(len(day) for day in availability.values())
+            })
+        found_ids = {b["id"] for b in found}
+        return FastJSONResponse({
+            "date_from": batch.date_from,
+            "date_to": batch.date_to,
+            "barbers": barbers,
+            "not_found": [barber_id for barber_id in barber_ids if barber_id not in found_ids]
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in batch availability")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/availability/earliest")
+async def get_earliest_availability(
+    request: Request,
+    response: Response,
+    service: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Soonest open slots across every barber offering service, from after (default now), earliest first"""
+    try:
+        after_key = parse_display(after) if after else None
+        if after and after_key is None:
+            raise HTTPException(status_code=400, detail="after must be YYYY-MM-DD, YYYY-MM-DD HH:MM AM or ISO 8601")
+        snapshot = await _get_snapshot()
+        if service and not snapshot.directory.barbers_for_service(service):
+            raise HTTPException(status_code=404, detail="No barber offers this service")
+        
+        openings = earliest_openings(snapshot, service, after_key, limit)
+        result = {
+            "service": service,
+            "after": after,
+            "openings": [
+                {
+                    "barber_id": o.barber_id,
+                    "barber_name": o.barber_name,
+                    "raw": o.raw,
+                    "formatted": o.formatted
+                }
+                for o in openings
+            ]
+        }
+        # Without after the answer moves with the clock, so tag the body (and skip Last-Modified)
+        return _conditional(request, response, _body_etag(result)) or _json(result, response)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in earliest availability")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/bookings", response_model=BookingResponse)
 async def create_booking(booking: BookingRequest):
-    """Create a new booking and add to Google Calendar via n8n webhook"""
+    """Reserve the slot and queue the Google Calendar event (poll /bookings/{ref}/calendar)"""
     try:
         # First, verify the barber exists and has the requested slot
-        barber_res = supabase.table("Barber_bookings").select("*").eq("id", booking.barber_id).execute()
-        
-        if barber_res.error or not barber_res.data:
+        barber = await run_db(repository.get_barber, booking.barber_id)
+        if not barber:
             raise HTTPException(status_code=404, detail="Barber not found")
         
-        barber_data = barber_res.data[0]
-        barber_name = barber_data.get("Barber", "").strip()
-        
-        # Get current available slots
-        current_slots = []
-        slot_key = None
-        for k in barber_data.keys():
-            if "available" in k.lower() and "slot" in k.lower():
-                current_slots = barber_data.get(k) or []
-                slot_key = k
-                break
-        
-        # Check if the requested slot is available
-        slot_found = False
-        updated_slots = []
-        
-        for slot in current_slots:
-            formatted_slot = _parse_ts_item(slot)
-            if formatted_slot == booking.appointment_time:
-                slot_found = True
-                # Don't add this slot to updated_slots (remove it)
-            else:
-                updated_slots.append(slot)
-        
-        if not slot_found:
+        barber_name = barber["name"]
+        
+        # Check if the requested slot is still open
+        stored_slot = await run_db(repository.open_slot, barber, booking.appointment_time)
+        if stored_slot is None:
             raise HTTPException(status_code=400, detail="Requested time slot is not available")
         
         # Verify the service is offered by this barber
-        services = str(barber_data.get("Services", ""))
-        available_services = [s.strip() for s in services.split(",") if s.strip()]
+        available_services = list(split_services(barber["services"]))
         
         if booking.service not in available_services:
             raise HTTPException(
@@ -328,39 +560,32 @@ async def create_booking(booking: BookingRequest):
             "status": "confirmed"
         }
         
-        # Call n8n webhook to create booking and Google Calendar event
-        webhook_result = call_n8n_webhook(booking_data)
+        # Reserve the slot first; the database removes it atomically, so
+        # concurrent bookings for this barber cannot overwrite each other
+        # (the repository also refreshes the shared snapshot)
+        outcome = await run_db(repository.reserve_slot, booking.barber_id, stored_slot)
         
-        if not webhook_result["success"]:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to create calendar event: {webhook_result.get('error', 'Unknown error')}"
-            )
+        if outcome == TAKEN:
+            raise HTTPException(status_code=409, detail="Requested time slot was just booked by someone else")
+        if outcome == NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Barber not found")
         
-        # Update the barber's available slots (remove the booked slot)
-        if slot_key:
-            update_res = supabase.table("Barber_bookings").update({
-                slot_key: updated_slots
-            }).eq("id", booking.barber_id).execute()
-            
-            if update_res.error:
-                logger.error(f"Error updating slots: {update_res.error}")
-                # Don't fail the booking completely, but log the error
+        # Queue the n8n webhook; the Google Calendar event is created in the background
+        booking_ref = await run_db(booking_outbox.enqueue, booking_data, N8N_WEBHOOK_URL, WEBHOOK_USER_AGENT)
         
         # TODO: In a real app, you'd also insert the booking into a separate bookings table:
         # booking_insert_data = {
         #     **booking_data,
-        #     "calendar_event_id": webhook_result.get("calendar_event_id"),
+        #     "booking_ref": booking_ref,
         #     "created_at": datetime.now().isoformat()
         # }
         # booking_res = supabase.table("bookings").insert(booking_insert_data).execute()
         
         return BookingResponse(
             success=True,
-            message=f"Appointment successfully booked with {barber_name} for {booking.service} at {booking.appointment_time} and added to Google Calendar",
-            booking_id=webhook_result.get("booking_id"),
-            calendar_event_id=webhook_result.get("calendar_event_id"),
-            calendar_link=webhook_result.get("calendar_link")
+            message=f"Appointment successfully booked with {barber_name} for {booking.service} at {booking.appointment_time}; Google Calendar event pending",
+            booking_ref=booking_ref,
+            calendar_status="pending"
         )
         
     except HTTPException:
@@ -370,6 +595,15 @@ async def create_booking(booking: BookingRequest):
         raise HTTPException(status_code=500, detail=f"Failed to create booking: {str(e)}")
 
 
+@app.get("/bookings/{booking_ref}/calendar")
+async def get_booking_calendar(booking_ref: str):
+    """Google Calendar status of a booking: pending, confirmed or failed"""
+    status = await run_db(booking_outbox.status, booking_ref)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return status
+
+
 @app.get("/bookings")
 async def get_all_bookings():
     """Get all bookings - placeholder for future implementation"""
@@ -380,24 +614,17 @@ async def get_all_bookings():
 
 
 @app.get("/services")
-async def get_all_services():
+async def get_all_services(request: Request, response: Response):
     """Get all unique services offered across all barbers"""
     try:
-        res = supabase.table("Barber_bookings").select("Services").execute()
-        
-        if res.error:
-            raise HTTPException(status_code=500, detail=str(res.error))
-        
-        all_services = set()
-        for row in res.data or []:
-            services = str(row.get("Services", ""))
-            for service in services.split(","):
-                service = service.strip()
-                if service:
-                    all_services.add(service)
+        snapshot = await _get_snapshot()
+        not_modified = _conditional(request, response, _snapshot_etag(snapshot, request), snapshot.changed_at)
+        if not_modified:
+            return not_modified
+        all_services = snapshot.directory.all_services()
         
         return {
-            "services": sorted(list(all_services)),
+            "services": all_services,
             "total": len(all_services)
         }
         
@@ -424,7 +651,7 @@ async def test_n8n_webhook(test_data: dict = None):
                 "customer_email": "test@example.com"
             }
         
-        result = call_n8n_webhook(test_data)
+        result = await run_webhook(call_n8n_webhook, test_data)
         return result
         
     except Exception as e:
@@ -438,8 +665,7 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        test_res = supabase.table("Barber_bookings").select("id").limit(1).execute()
-        db_status = "connected" if not test_res.error else "error"
+        db_status = "connected" if await run_db(repository.ping) else "error"
         
         # Test n8n webhook (optional - comment out if causing issues)
         # webhook_status = "unknown"
@@ -453,6 +679,9 @@ async def health_check():
             "status": "healthy",
             "database": db_status,
             "n8n_webhook_url": N8N_WEBHOOK_URL,
+            "webhook_metrics": webhook.stats(),
+            "booking_outbox": await run_db(booking_outbox.stats),
+            "repository_metrics": repository.stats(),
             # "webhook_status": webhook_status,
             "timestamp": datetime.now().isoformat()
         }
@@ -0,0 +1,59 @@
+import threading
+from typing import Dict, Any, Tuple
+from barber_cache import BarberSnapshot
+
+KNOWLEDGE_BASE_HEADER = "BARBER SALON INFORMATION:\n\n"
+
+# Slots listed per barber before truncating with "..."
+MAX_SLOTS_PER_BARBER = 10
+
+
+def render_barber_fragment(snapshot: BarberSnapshot, barber: Dict[str, Any]) -> str:
+    """Render one barber's section of the knowledge base"""
+    services = snapshot.directory.services(barber["id"])
+    slots = snapshot.slot_index(barber["id"]).formatted()
+    more = "..." if len(slots) > MAX_SLOTS_PER_BARBER else ""
+    return "".join((
+        f"Barber ID: {barber['id']}\n",
+        f"Barber Name: {barber['name']}\n",
+        f"Services: {', '.join(services)}\n",
+        f"Available Slots: {', '.join(slots[:MAX_SLOTS_PER_BARBER])}{more}\n",
+        "---\n",
+    ))
+
+
+class KnowledgeBaseRenderer:
+    """Renders the salon knowledge base once per snapshot, reusing unchanged barber fragments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # barber id -> (source fields the fragment was rendered from, fragment)
+        self._fragments: Dict[Any, Tuple[Tuple[Any, ...], str]] = {}
+        self.fragments_rendered = 0
+        self.fragments_reused = 0
+
+    def render(self, snapshot: BarberSnapshot) -> str:
+        """Knowledge base text for a snapshot (memoized on the snapshot)"""
+        return snapshot.derived("knowledge_base", self._assemble)
+
+    def _assemble(self, snapshot: BarberSnapshot) -> str:
+        with self._lock:
+            fragments = {}
+            parts = [KNOWLEDGE_BASE_HEADER]
+            for barber in snapshot.barbers:
+                source = (barber["name"], barber["services"], tuple(barber["slots"]))
+                cached = self._fragments.get(barber["id"])
+                if cached is not None and cached[0] == source:
+                    fragment = cached[1]
+                    self.fragments_reused += 1
+                else:
+                    fragment = render_barber_fragment(snapshot, barber)
+                    self.fragments_rendered += 1
+                fragments[barber["id"]] = (source, fragment)
+                parts.append(fragment)
+            # Only keep fragments for barbers still in the roster
+            self._fragments = fragments
+            return "".join(parts)
+
+
+knowledge_base = KnowledgeBaseRenderer()
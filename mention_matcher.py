@@ -0,0 +1,67 @@
+import re
+from typing import List, Dict, Any, NamedTuple, Iterable, Tuple
+from barber_directory import BarberDirectory, normalize_name
+
+
+class Mention(NamedTuple):
+    kind: str    # "barber" or "service"
+    value: Any   # barber id, or normalized service name
+    text: str    # matched text as typed
+    start: int
+    end: int
+
+
+def _trie_regex(phrases: Iterable[str]) -> str:
+    """Compile phrases into a prefix-factored alternation (longest match first)"""
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        alternatives = []
+        for ch in sorted(k for k in node if k):
+            atom = r"\s+" if ch == " " else re.escape(ch)
+            alternatives.append(atom + build(node[ch]))
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # Greedy optional tail: try the longer phrase before stopping here
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class MentionMatcher:
+    """Finds every barber and service mention in one pass, built once per snapshot"""
+
+    def __init__(self, directory: BarberDirectory):
+        self._targets: Dict[str, List[Tuple[str, Any]]] = {}
+        for barber in directory.barbers:
+            self._add(normalize_name(barber["name"]), ("barber", barber["id"]))
+        for service_key in directory.service_names:
+            self._add(service_key, ("service", service_key))
+
+        self._pattern = None
+        if self._targets:
+            # Word boundaries keep "Ali" from matching inside "Alia"
+            self._pattern = re.compile(
+                r"(?<!\w)(?:" + _trie_regex(self._targets) + r")(?!\w)",
+                re.IGNORECASE
+            )
+
+    def _add(self, phrase: str, target: Tuple[str, Any]):
+        if phrase and target not in self._targets.setdefault(phrase, []):
+            self._targets[phrase].append(target)
+
+    def find(self, text: str) -> List[Mention]:
+        """All non-overlapping mentions in text order, preferring the longest phrase"""
+        if self._pattern is None or not text:
+            return []
+        mentions = []
+        for match in self._pattern.finditer(text):
+            for kind, value in self._targets.get(normalize_name(match.group(0)), ()):
+                mentions.append(Mention(kind, value, match.group(0), match.start(), match.end()))
+        return mentions
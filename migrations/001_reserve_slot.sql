@@ -0,0 +1,77 @@
+-- Atomic slot reservation for "Barber_bookings"."Available Slots".
+--
+-- Booking used to read the barber row, drop the slot in Python and write the
+-- whole array back, so two concurrent bookings for one barber could overwrite
+-- each other. reserve_slot removes a single slot in one conditional UPDATE:
+-- a concurrent booking waits only for that statement, then re-checks the slot
+-- against the committed row and gets 'taken' if it is gone.
+--
+-- "Available Slots" may be a timestamptz[] / text[] array or a jsonb array of
+-- timestamp strings; the column type is checked on each call and any other
+-- type raises an error naming it. In the jsonb case elements are compared as
+-- timestamps, so the stored spelling of a slot doesn't have to match p_slot.
+--
+-- Run in the Supabase SQL editor (or psql) once per database.
+
+create or replace function reserve_slot(p_barber_id bigint, p_slot timestamptz)
+returns text
+language plpgsql
+as $$
+declare
+    v_id bigint;
+    v_type text;
+begin
+    select format_type(a.atttypid, a.atttypmod) into v_type
+      from pg_attribute a
+     where a.attrelid = '"Barber_bookings"'::regclass
+       and a.attname = 'Available Slots'
+       and not a.attisdropped;
+
+    if v_type = 'jsonb' then
+        -- Rebuild the array without the slot; the exists check is re-evaluated
+        -- against the committed row if a concurrent booking updated it first
+        update "Barber_bookings" b
+           set "Available Slots" = (
+                   select coalesce(jsonb_agg(e.value order by e.ordinality), '[]'::jsonb)
+                     from jsonb_array_elements(b."Available Slots") with ordinality as e(value, ordinality)
+                    where (e.value #>> '{}')::timestamptz is distinct from p_slot
+               )
+         where b.id = p_barber_id
+           and jsonb_typeof(b."Available Slots") = 'array'
+           and exists (
+                   select 1
+                     from jsonb_array_elements_text(b."Available Slots") as s(slot)
+                    where s.slot::timestamptz = p_slot
+               )
+        returning b.id into v_id;
+    elsif v_type = 'timestamp with time zone[]' then
+        update "Barber_bookings"
+           set "Available Slots" = array_remove("Available Slots", p_slot)
+         where id = p_barber_id
+           and p_slot = any("Available Slots")
+        returning id into v_id;
+    elsif v_type = 'text[]' then
+        update "Barber_bookings" b
+           set "Available Slots" = array(
+                   select s.slot
+                     from unnest(b."Available Slots") with ordinality as s(slot, ordinality)
+                    where s.slot::timestamptz is distinct from p_slot
+                    order by s.ordinality
+               )
+         where b.id = p_barber_id
+           and exists (select 1 from unnest(b."Available Slots") as s(slot) where s.slot::timestamptz = p_slot)
+        returning b.id into v_id;
+    else
+        raise exception 'reserve_slot: "Barber_bookings"."Available Slots" has type %, expected jsonb, timestamptz[] or text[]',
+            coalesce(v_type, 'none (column not found)');
+    end if;
+
+    if v_id is not null then
+        return 'reserved';
+    end if;
+    if exists (select 1 from "Barber_bookings" where id = p_barber_id) then
+        return 'taken';
+    end if;
+    return 'not_found';
+end;
+$$;
@@ -0,0 +1,85 @@
+-- Normalized availability: one row per (barber, start time) in "slots".
+--
+-- "Barber_bookings"."Available Slots" holds every slot of a barber in one
+-- array, so reads download whole schedules and each booking rewrites one.
+-- With this table, readers filter by barber, status and time range in the
+-- database, and a booking flips the status of a single row.
+--
+-- Apply together with SLOTS_SOURCE=table in the app environment: after this
+-- migration reserve_slot books rows of "slots" and no longer edits the array.
+
+create table if not exists slots (
+    id bigserial primary key,
+    barber_id bigint not null references "Barber_bookings" (id) on delete cascade,
+    start_time timestamptz not null,
+    status text not null default 'available' check (status in ('available', 'booked')),
+    booked_at timestamptz,
+    unique (barber_id, start_time)
+);
+
+-- Range scans over one barber's open slots (availability, batch and earliest searches)
+create index if not exists slots_available_by_barber
+    on slots (barber_id, start_time) where status = 'available';
+
+-- Range scans across all barbers ("who is free soonest")
+create index if not exists slots_available_by_time
+    on slots (start_time) where status = 'available';
+
+-- Backfill from the availability column (jsonb array, timestamptz[] or
+-- text[]; any other type stops the migration); safe to re-run
+do $$
+declare
+    v_type text;
+begin
+    select format_type(a.atttypid, a.atttypmod) into v_type
+      from pg_attribute a
+     where a.attrelid = '"Barber_bookings"'::regclass
+       and a.attname = 'Available Slots'
+       and not a.attisdropped;
+
+    if v_type = 'jsonb' then
+        insert into slots (barber_id, start_time)
+        select b.id, (s.slot)::timestamptz
+          from "Barber_bookings" b
+         cross join lateral jsonb_array_elements_text(b."Available Slots") as s(slot)
+         where jsonb_typeof(b."Available Slots") = 'array'
+           and s.slot is not null
+        on conflict (barber_id, start_time) do nothing;
+    elsif v_type in ('timestamp with time zone[]', 'text[]') then
+        insert into slots (barber_id, start_time)
+        select b.id, (s.slot)::timestamptz
+          from "Barber_bookings" b
+         cross join lateral unnest(b."Available Slots") as s(slot)
+         where s.slot is not null
+        on conflict (barber_id, start_time) do nothing;
+    else
+        raise exception 'slots backfill: "Barber_bookings"."Available Slots" has type %, expected jsonb, timestamptz[] or text[]',
+            coalesce(v_type, 'none (column not found)');
+    end if;
+end;
+$$;
+
+-- Same contract as 001: 'reserved', 'taken' or 'not_found'
+create or replace function reserve_slot(p_barber_id bigint, p_slot timestamptz)
+returns text
+language plpgsql
+as $$
+declare
+    v_id bigint;
+begin
+    update slots
+       set status = 'booked', booked_at = now()
+     where barber_id = p_barber_id
+       and start_time = p_slot
+       and status = 'available'
+    returning id into v_id;
+
+    if v_id is not null then
+        return 'reserved';
+    end if;
+    if exists (select 1 from "Barber_bookings" where id = p_barber_id) then
+        return 'taken';
+    end if;
+    return 'not_found';
+end;
+$$;
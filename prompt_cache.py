@@ -0,0 +1,94 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, Any, Tuple
+import google.generativeai as genai
+
+logger = logging.getLogger("prompt_cache")
+
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Opt in to Gemini context caching (cached-content handles). The provider has a
+# minimum cacheable size; when creation fails we fall back to the local handle.
+USE_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+class PromptPrefixCache:
+    """Reuses one Gemini model handle per static prompt prefix across turns and sessions.
+
+    With context caching enabled the prefix is uploaded once as cached content
+    and later requests send only the user turn. Otherwise the handle carries the
+    prefix as its system instruction, so it is built once instead of per turn.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME, use_context_cache: bool = USE_CONTEXT_CACHE,
+                 ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS):
+        self.model_name = model_name
+        self.use_context_cache = use_context_cache
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # prefix digest -> (model handle, created_at, is_provider_cached)
+        self._entries: Dict[str, Tuple[Any, float, bool]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def model_for(self, prefix: str):
+        """Model handle whose system instruction is prefix"""
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._usable(entry):
+                self.hits += 1
+                if entry[2]:
+                    # Only cached content spares the upload; a local handle still sends the prefix
+                    self.bytes_saved += len(prefix.encode("utf-8"))
+                return entry[0]
+            self.misses += 1
+
+        # Built outside the lock: CachedContent.create is a network call
+        model, provider_cached = self._build(prefix)
+        with self._lock:
+            # Another thread may have built the same prefix meanwhile; keep the first
+            entry = self._entries.get(key)
+            if self._usable(entry):
+                return entry[0]
+            self._entries[key] = (model, time.monotonic(), provider_cached)
+            return model
+
+    def _usable(self, entry) -> bool:
+        # Provider caches expire; rebuild shortly before the TTL runs out
+        return bool(entry) and (not entry[2] or time.monotonic() - entry[1] < self.ttl_seconds * 0.9)
+
+    def _build(self, prefix: str):
+        if self.use_context_cache:
+            try:
+                cached = genai.caching.CachedContent.create(
+                    model=f"models/{self.model_name}",
+                    system_instruction=prefix,
+                    ttl=timedelta(seconds=self.ttl_seconds)
+                )
+                logger.info(f"Created Gemini cached content {cached.name}")
+                return genai.GenerativeModel.from_cached_content(cached_content=cached), True
+            except Exception as e:
+                logger.warning(f"Gemini context cache unavailable, using local prefix handle: {str(e)}")
+        return genai.GenerativeModel(self.model_name, system_instruction=prefix), False
+
+    def stats(self) -> Dict[str, Any]:
+        """Prefix-hit and bytes-saved metrics"""
+        total = self.hits + self.misses
+        return {
+            "prefix_hits": self.hits,
+            "prefix_misses": self.misses,
+            "prefix_hit_rate": self.hits / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "context_cache_enabled": self.use_context_cache
+        }
+
+
+# Shared by every BarberChatbot in the process
+prefix_cache = PromptPrefixCache()
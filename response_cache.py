@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger("response_cache")
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+DEFAULT_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+# Optional SQLite file shared by every worker process; unset keeps the cache in memory
+DEFAULT_DB_PATH = os.getenv("RESPONSE_CACHE_DB") or None
+
+# Expired rows are purged from SQLite every this many writes
+_PRUNE_EVERY = 100
+
+
+def normalize_input(text: str) -> str:
+    """Case/whitespace/punctuation-insensitive form of a user message"""
+    return " ".join(re.sub(r"[^\w@.:-]+", " ", text.lower()).split()).strip(".")
+
+
+def make_cache_key(user_input: str, context: Dict[str, Any], snapshot_fingerprint: str) -> str:
+    """Key on everything the prompt depends on: message, booking context and salon data"""
+    parts = [
+        normalize_input(user_input),
+        str(context.get("booking_step", "initial")),
+        str(context.get("selected_barber_id")),
+        str(context.get("selected_service")),
+        str(context.get("selected_slot")),
+        str(context.get("customer_name")),
+        str(context.get("customer_phone")),
+        str(context.get("customer_email")),
+        snapshot_fingerprint,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM replies, optionally backed by a shared SQLite file"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 db_path: Optional[str] = DEFAULT_DB_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.db_path and self._db is None:
+            try:
+                self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Response cache database unavailable, using memory only: {str(e)}")
+                self.db_path = None
+                self._db = None
+        return self._db
+
+    def _fresh(self, created_at: float) -> bool:
+        return time.time() - created_at < self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached reply for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+
+            db = self._connect()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT response, created_at FROM response_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Response cache read failed: {str(e)}")
+                    row = None
+                if row is not None and self._fresh(row[1]):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.shared_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str):
+        """Store a reply"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, response, created_at)
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, created_at)
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    db.execute("DELETE FROM response_cache WHERE created_at < ?", (created_at - self.ttl_seconds,))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache write failed: {str(e)}")
+
+    def clear(self):
+        """Drop every cached reply"""
+        with self._lock:
+            self._entries.clear()
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM response_cache")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "persistent": bool(self.db_path)
+        }
+
+
+# Shared by every BarberChatbot in the process
+response_cache = ResponseCache()
@@ -0,0 +1,52 @@
+import threading
+from typing import Dict, Any, Optional
+
+
+def booking_summary(context: Dict[str, Any]) -> str:
+    """Summary shown once every booking detail has been collected"""
+    return f"Perfect! I have all the details for your appointment:\n\n📋 Booking Summary:\n- Barber: {context['selected_barber']}\n- Service: {context['selected_service']}\n- Time: {context['selected_slot']}\n- Name: {context['customer_name']}\n- Phone: {context['customer_phone']}\n- Email: {context['customer_email']}\n\n📅 Your appointment will be automatically added to Google Calendar upon confirmation.\n\nShall I confirm this booking for you? Just say 'yes' or 'confirm' to proceed! ✅"
+
+
+def missing_details_request(context: Dict[str, Any]) -> Optional[str]:
+    """Ask for name, phone and email together; None when nothing is missing"""
+    missing = []
+    if not context.get("customer_name"):
+        missing.append("full name")
+    if not context.get("customer_phone"):
+        missing.append("phone number")
+    if not context.get("customer_email"):
+        missing.append("email address")
+    if not missing:
+        return None
+    if len(missing) == 3:
+        ask = "your full name, phone number, and email address"
+    elif len(missing) == 2:
+        ask = f"your {missing[0]} and {missing[1]}"
+    else:
+        ask = f"your {missing[0]}"
+    return (
+        "Perfect! To complete your booking, please provide " + ask + ".\n"
+        "Example: 'Name Ali, phone 03001234567, email ali@example.com'"
+    )
+
+
+class DeterministicResponder:
+    """Answers turns whose reply is fully determined by the booking context, without the LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.llm_calls_avoided = 0
+
+    def respond(self, context: Dict[str, Any]) -> Optional[str]:
+        """Template reply for this turn, or None if the LLM is needed"""
+        step = context.get("booking_step")
+        reply = None
+        if step == "details_complete":
+            reply = booking_summary(context)
+        elif step in ["slot_selected", "collecting_details"]:
+            reply = missing_details_request(context)
+
+        if reply is not None:
+            with self._lock:
+                self.llm_calls_avoided += 1
+        return reply
@@ -0,0 +1,194 @@
+import os
+import re
+from datetime import datetime
+from typing import List, Dict, Any, NamedTuple, Optional
+import numpy as np
+from barber_cache import BarberSnapshot
+from barber_directory import normalize_name
+from slots import format_slot_key
+
+# Fragments passed to Gemini per turn, and the approximate token budget they share
+DEFAULT_TOP_K = int(os.getenv("RAG_TOP_K", "12"))
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", "1200"))
+
+RETRIEVAL_HEADER = "RELEVANT SALON DATA:\n\n"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Boost for fragments about the barber the customer already picked
+SELECTED_BARBER_BOOST = 5.0
+# Boost for barber profiles offering the service the customer already picked
+SELECTED_SERVICE_BOOST = 2.0
+# Small priors so that, with no query match, the roster and the earliest days win
+PROFILE_PRIOR = 0.2
+SLOT_DAY_PRIOR = 0.1
+
+_TOKEN_RE = re.compile(r"\d{4}-\d{2}-\d{2}|[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a an and are at can do doe for have i is it me my of on or please show "
+    "the to what when who with you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with a naive plural fold ("barbers" -> "barber")"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.isdigit():
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class Fragment(NamedTuple):
+    kind: str          # "profile" or "slots"
+    barber_id: Any
+    day: Optional[str]  # YYYY-MM-DD for slot fragments
+    text: str
+
+
+class RetrievalIndex:
+    """BM25 index over per-barber profile and per-day slot fragments of one snapshot"""
+
+    def __init__(self, fragments: List[Fragment], barbers_by_service: Dict[str, tuple]):
+        self.fragments = fragments
+
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = np.zeros(len(fragments), dtype=np.float32)
+        for doc_id, fragment in enumerate(fragments):
+            tokens = tokenize(fragment.text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        n_docs = max(len(fragments), 1)
+        avg_len = float(lengths.mean()) if len(fragments) else 1.0
+        self._norm = K1 * (1 - B + B * lengths / max(avg_len, 1.0))
+        self._postings = {}
+        for token, counts in postings.items():
+            doc_ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            idf = np.log(1 + (n_docs - len(counts) + 0.5) / (len(counts) + 0.5))
+            self._postings[token] = (doc_ids, tf, np.float32(idf))
+
+        self._prior = np.array(
+            [PROFILE_PRIOR if f.kind == "profile" else SLOT_DAY_PRIOR for f in fragments],
+            dtype=np.float32
+        )
+        # Earlier days rank slightly ahead of later ones when nothing else differs
+        for rank, doc_id in enumerate(sorted(
+                (i for i, f in enumerate(fragments) if f.kind == "slots"),
+                key=lambda i: fragments[i].day)):
+            self._prior[doc_id] -= SLOT_DAY_PRIOR * rank / max(len(fragments), 1)
+
+        # Vectorized context boosts: fragment -> barber position, service -> profile fragments
+        self._barber_pos: Dict[Any, int] = {}
+        for fragment in fragments:
+            self._barber_pos.setdefault(fragment.barber_id, len(self._barber_pos))
+        self._doc_barber = np.array([self._barber_pos[f.barber_id] for f in fragments], dtype=np.int32)
+        profile_of = {f.barber_id: i for i, f in enumerate(fragments) if f.kind == "profile"}
+        self._service_profiles = {
+            service: np.array([profile_of[b] for b in barber_ids if b in profile_of], dtype=np.int32)
+            for service, barber_ids in barbers_by_service.items()
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: BarberSnapshot) -> "RetrievalIndex":
+        fragments = []
+        directory = snapshot.directory
+        for barber in snapshot.barbers:
+            services = directory.services(barber["id"])
+            fragments.append(Fragment(
+                "profile", barber["id"], None,
+                f"Barber ID: {barber['id']}\nBarber Name: {barber['name']}\nServices: {', '.join(services)}\n"
+            ))
+
+            days: Dict[str, List[int]] = {}
+            for key in snapshot.slot_index(barber["id"]).keys:
+                days.setdefault(format_slot_key(key)[:10], []).append(key)
+            for day, keys in days.items():
+                date = datetime.strptime(day, "%Y-%m-%d")
+                label = f"{date:%A}, {date:%B} {date.day}"
+                times = ", ".join(format_slot_key(k)[11:] for k in keys)
+                fragments.append(Fragment(
+                    "slots", barber["id"], day,
+                    f"Available Slots for {barber['name']} (ID: {barber['id']}) on {day} ({label}): {times}\n"
+                ))
+        return cls(fragments, directory.barbers_by_service)
+
+    def score(self, query: str, context: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """BM25 score of every fragment for query, boosted by the booking context"""
+        context = context or {}
+        terms = tokenize(query)
+        for extra in (context.get("selected_barber"), context.get("selected_service")):
+            if extra:
+                terms += tokenize(str(extra))
+
+        scores = self._prior.copy()
+        for term in set(terms):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tf, idf = posting
+            scores[doc_ids] += idf * tf * (K1 + 1) / (tf + self._norm[doc_ids])
+
+        service_profiles = self._service_profiles.get(normalize_name(context.get("selected_service")))
+        if service_profiles is not None:
+            scores[service_profiles] += SELECTED_SERVICE_BOOST
+        selected_pos = self._barber_pos.get(context.get("selected_barber_id"))
+        if selected_pos is not None:
+            scores[self._doc_barber == selected_pos] += SELECTED_BARBER_BOOST
+        return scores
+
+    def retrieve(self, query: str, context: Optional[Dict[str, Any]] = None,
+                 top_k: int = DEFAULT_TOP_K, token_budget: int = DEFAULT_TOKEN_BUDGET) -> List[Fragment]:
+        """Highest scoring fragments that fit within top_k and token_budget"""
+        if not self.fragments:
+            return []
+        scores = self.score(query, context)
+        chosen, used = [], 0
+        # Budget skips rarely reach far down the ranking, so only sort the head:
+        # argpartition finds the head's lowest score in O(n), then just the
+        # fragments scoring at least that are sorted (ties by id, like a stable sort)
+        head = min(top_k * 4, len(scores))
+        if head < len(scores):
+            cutoff = scores[np.argpartition(-scores, head - 1)[head - 1]]
+            candidates = np.flatnonzero(scores >= cutoff)
+        else:
+            candidates = np.arange(len(scores))
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))][:head]
+        for doc_id in ranked:
+            fragment = self.fragments[doc_id]
+            cost = estimate_tokens(fragment.text)
+            if used + cost > token_budget:
+                continue
+            chosen.append(fragment)
+            used += cost
+            if len(chosen) >= top_k:
+                break
+        return chosen
+
+
+def retrieval_index(snapshot: BarberSnapshot) -> RetrievalIndex:
+    """Retrieval index for a snapshot (built once per snapshot version)"""
+    return snapshot.derived("retrieval", RetrievalIndex.from_snapshot)
+
+
+def render_fragments(fragments: List[Fragment]) -> str:
+    """Assemble retrieved fragments, grouped by barber with profiles first"""
+    order = {}
+    for fragment in fragments:
+        order.setdefault(fragment.barber_id, len(order))
+    ordered = sorted(fragments, key=lambda f: (order[f.barber_id], f.kind != "profile", f.day or ""))
+    return RETRIEVAL_HEADER + "".join(f.text for f in ordered)
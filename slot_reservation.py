@@ -0,0 +1,42 @@
+import logging
+from typing import Any
+
+logger = logging.getLogger("slot_reservation")
+
+# Postgres function from migrations/001_reserve_slot.sql
+RESERVE_SLOT_RPC = "reserve_slot"
+
+# Outcomes returned by reserve_slot
+RESERVED = "reserved"
+TAKEN = "taken"
+NOT_FOUND = "not_found"
+
+
+def _outcome(response: Any) -> str:
+    """Outcome from an rpc() response (a scalar, or a one-element list on some clients)"""
+    data = getattr(response, "data", None)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if data not in (RESERVED, TAKEN, NOT_FOUND):
+        raise RuntimeError(f"Unexpected {RESERVE_SLOT_RPC} result: {data!r}")
+    return data
+
+
+def reserve_slot(client: Any, barber_id: int, raw_slot: Any) -> str:
+    """Atomically remove one stored slot from a barber; returns RESERVED, TAKEN or NOT_FOUND.
+
+    Concurrent bookings for the same barber are safe: the database checks and
+    removes the slot in one statement, so at most one of them gets RESERVED.
+    """
+    response = client.rpc(RESERVE_SLOT_RPC, {"p_barber_id": barber_id, "p_slot": raw_slot}).execute()
+    outcome = _outcome(response)
+    logger.info(f"reserve_slot barber={barber_id} slot={raw_slot}: {outcome}")
+    return outcome
+
+
+async def areserve_slot(client: Any, barber_id: int, raw_slot: Any) -> str:
+    """Async reserve_slot() on the async Supabase client"""
+    response = await client.rpc(RESERVE_SLOT_RPC, {"p_barber_id": barber_id, "p_slot": raw_slot}).execute()
+    outcome = _outcome(response)
+    logger.info(f"reserve_slot barber={barber_id} slot={raw_slot}: {outcome}")
+    return outcome
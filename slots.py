@@ -0,0 +1,116 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+# Display format used throughout the chatbot and the API
+DISPLAY_FORMAT = "%Y-%m-%d %I:%M %p"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_key(dt: datetime) -> int:
+    # UTC epoch minutes: aware values are converted to UTC first, naive ones
+    # are taken as UTC (timestamptz comes back from Supabase in UTC)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((dt - _EPOCH).total_seconds() // 60)
+
+
+def parse_slot(raw: Any) -> Optional[int]:
+    """Parse a stored ISO slot into its canonical key (UTC epoch minutes)"""
+    if not raw:
+        return None
+    try:
+        return _to_key(datetime.fromisoformat(str(raw).replace("Z", "+00:00")))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_display(text: str) -> Optional[int]:
+    """Parse a display string ("2024-01-05 09:00 AM") or ISO slot into a key"""
+    try:
+        return _to_key(datetime.strptime(" ".join(str(text).split()), DISPLAY_FORMAT))
+    except (TypeError, ValueError):
+        return parse_slot(text)
+
+
+def now_key() -> int:
+    """Key of the current UTC minute, for "from now on" searches"""
+    return _to_key(datetime.now(timezone.utc))
+
+
+@lru_cache(maxsize=65536)
+def format_slot_key(key: int) -> str:
+    """Render a slot key for display, in UTC (memoized)"""
+    return (_EPOCH + timedelta(minutes=key)).strftime(DISPLAY_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def key_date(key: int) -> str:
+    """YYYY-MM-DD date a slot key falls on (memoized)"""
+    return (_EPOCH + timedelta(minutes=key)).strftime("%Y-%m-%d")
+
+
+def key_to_iso(key: int) -> str:
+    """ISO timestamp of a slot key, for database range filters"""
+    return (_EPOCH + timedelta(minutes=key)).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def date_bounds(date: str) -> Tuple[int, int]:
+    """Key range [start, end) covering a YYYY-MM-DD date"""
+    start = _to_key(datetime.strptime(date, "%Y-%m-%d"))
+    return start, start + 24 * 60
+
+
+class SlotIndex:
+    """One barber's slots parsed once into a sorted array of canonical keys"""
+
+    def __init__(self, raw_slots: Iterable[Any]):
+        self._raw_by_key: Dict[int, Any] = {}
+        self.unparsed: List[Any] = []
+
+        for raw in raw_slots if isinstance(raw_slots, list) else []:
+            key = parse_slot(raw)
+            if key is None:
+                self.unparsed.append(raw)
+            else:
+                self._raw_by_key.setdefault(key, raw)
+
+        self.keys = array("q", sorted(self._raw_by_key))
+        self._formatted: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.unparsed)
+
+    def __contains__(self, key: Optional[int]) -> bool:
+        return key in self._raw_by_key
+
+    def raw(self, key: int) -> Any:
+        """Stored value for a key"""
+        return self._raw_by_key.get(key)
+
+    def raw_slots(self) -> List[Any]:
+        """Stored values in chronological order (unparseable ones last)"""
+        return [self._raw_by_key[k] for k in self.keys] + self.unparsed
+
+    def formatted(self) -> List[str]:
+        """Display strings aligned with raw_slots(), rendered once"""
+        if self._formatted is None:
+            self._formatted = [format_slot_key(k) for k in self.keys] + [str(u) for u in self.unparsed]
+        return self._formatted
+
+    def find_display(self, text: str) -> Optional[int]:
+        """Key of the slot shown as text, if this barber has it"""
+        key = parse_display(text)
+        return key if key in self._raw_by_key else None
+
+    def between(self, start: Optional[int], end: Optional[int]) -> List[int]:
+        """Keys in [start, end); None leaves that side open"""
+        low = 0 if start is None else bisect_left(self.keys, start)
+        high = len(self.keys) if end is None else bisect_left(self.keys, end)
+        return list(self.keys[low:high])
+
+
+EMPTY_SLOT_INDEX = SlotIndex([])
@@ -0,0 +1,109 @@
+import os
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
+from slots import date_bounds, key_to_iso
+
+logger = logging.getLogger("slots_table")
+
+# "array" reads "Barber_bookings"."Available Slots"; "table" reads the normalized
+# slots table from migrations/002_slots_table.sql
+SLOTS_SOURCE = os.getenv("SLOTS_SOURCE", "array").lower()
+# Days of open slots loaded into the shared snapshot; 0 loads every open slot
+SLOTS_HORIZON_DAYS = int(os.getenv("SLOTS_HORIZON_DAYS", "60"))
+# PostgREST caps each response, so larger reads are fetched in pages
+PAGE_SIZE = 1000
+
+SLOTS_TABLE = "slots"
+AVAILABLE = "available"
+# Barber columns the snapshot needs when slots come from the slots table
+BARBER_COLUMNS = "id,Barber,Services"
+# Column the snapshot and the chatbot read slots from
+SLOT_COLUMN = "Available Slots"
+
+
+def use_slots_table() -> bool:
+    """Whether availability is read from the normalized slots table"""
+    return SLOTS_SOURCE == "table"
+
+
+def horizon_bounds() -> Tuple[Optional[int], Optional[int]]:
+    """Key range of open slots kept in the snapshot: today through SLOTS_HORIZON_DAYS"""
+    if SLOTS_HORIZON_DAYS <= 0:
+        return None, None
+    today, _ = date_bounds(datetime.utcnow().strftime("%Y-%m-%d"))
+    return today, today + SLOTS_HORIZON_DAYS * 24 * 60
+
+
+def available_slots_query(client: Any, barber_id: Union[int, List[int], None] = None,
+                          start: Optional[int] = None, end: Optional[int] = None):
+    """Open slots, filtered in the database by barber (one id or a list) and by key range [start, end)"""
+    query = client.table(SLOTS_TABLE).select("barber_id,start_time").eq("status", AVAILABLE)
+    if isinstance(barber_id, list):
+        query = query.in_("barber_id", barber_id)
+    elif barber_id is not None:
+        query = query.eq("barber_id", barber_id)
+    if start is not None:
+        query = query.gte("start_time", key_to_iso(start))
+    if end is not None:
+        query = query.lt("start_time", key_to_iso(end))
+    return query.order("barber_id").order("start_time")
+
+
+def _fetch_pages(make_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+    rows = []
+    while True:
+        page = make_query().range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+async def _afetch_pages(make_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+    rows = []
+    while True:
+        page = (await make_query().range(len(rows), len(rows) + PAGE_SIZE - 1).execute()).data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def attach_slots(barbers: List[Dict[str, Any]], slot_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Barber rows with their open start times under SLOT_COLUMN, as the snapshot expects"""
+    by_barber: Dict[Any, List[Any]] = {}
+    for row in slot_rows:
+        by_barber.setdefault(row["barber_id"], []).append(row["start_time"])
+    return [{**barber, SLOT_COLUMN: by_barber.get(barber.get("id"), [])} for barber in barbers]
+
+
+def fetch_barber_rows(client: Any) -> List[Dict[str, Any]]:
+    """Barber rows with open slots inside the horizon (two queries, independent of schedule length)"""
+    barbers = client.table("Barber_bookings").select(BARBER_COLUMNS).execute().data or []
+    slot_rows = _fetch_pages(lambda: available_slots_query(client, None, *horizon_bounds()))
+    logger.info(f"Loaded {len(slot_rows)} open slots for {len(barbers)} barbers from {SLOTS_TABLE}")
+    return attach_slots(barbers, slot_rows)
+
+
+async def afetch_barber_rows(client: Any) -> List[Dict[str, Any]]:
+    """Async fetch_barber_rows() on the async Supabase client"""
+    barbers = (await client.table("Barber_bookings").select(BARBER_COLUMNS).execute()).data or []
+    slot_rows = await _afetch_pages(lambda: available_slots_query(client, None, *horizon_bounds()))
+    logger.info(f"Loaded {len(slot_rows)} open slots for {len(barbers)} barbers from {SLOTS_TABLE}")
+    return attach_slots(barbers, slot_rows)
+
+
+def fetch_open_slots(client: Any, barber_ids: List[int], start: Optional[int] = None,
+                     end: Optional[int] = None) -> Dict[Any, List[Any]]:
+    """Open start times in [start, end) for several barbers, in one paged query"""
+    if not barber_ids:
+        return {}
+    by_barber: Dict[Any, List[Any]] = {}
+    for row in _fetch_pages(lambda: available_slots_query(client, list(barber_ids), start, end)):
+        by_barber.setdefault(row["barber_id"], []).append(row["start_time"])
+    return by_barber
+
+
+def fetch_available(client: Any, barber_id: int, start: Optional[int] = None, end: Optional[int] = None) -> List[Any]:
+    """One barber's open start times in [start, end), straight from the database"""
+    rows = _fetch_pages(lambda: available_slots_query(client, barber_id, start, end))
+    return [row["start_time"] for row in rows]
@@ -0,0 +1,537 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import slots_table
+from barber_repository import find_slot_column
+from slot_reservation import RESERVE_SLOT_RPC, RESERVED, TAKEN, NOT_FOUND
+
+# The hosted client is only needed when SUPABASE_BACKEND=supabase
+try:
+    from supabase import create_client as _supabase_client, acreate_client as _asupabase_client
+except ImportError:
+    _supabase_client = _asupabase_client = None
+
+logger = logging.getLogger("supabase_backend")
+
+# "supabase" talks to SUPABASE_URL; "local" keeps the tables in this process
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "supabase").lower()
+# Seconds added to every local query, standing in for the network round trip
+LOCAL_LATENCY = float(os.getenv("SUPABASE_LOCAL_LATENCY", "0"))
+# JSON file of {"table": [rows]} to start from; a generated demo roster when unset
+LOCAL_SEED = os.getenv("SUPABASE_LOCAL_SEED") or None
+# Rows per response, like PostgREST's max-rows (the app pages past it)
+LOCAL_MAX_ROWS = 1000
+# Filtered, sorted scans kept for paging through the same query
+SCAN_CACHE_SIZE = 16
+
+# (parent table, embedded table) -> foreign key column on the embedded table
+FOREIGN_KEYS = {("Barber_bookings", slots_table.SLOTS_TABLE): "barber_id"}
+
+_TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+
+
+def uses_local_backend() -> bool:
+    """Whether create_client() returns the in-process stand-in"""
+    return SUPABASE_BACKEND == "local"
+
+
+@lru_cache(maxsize=1 << 20)
+def _instant(value: str) -> Any:
+    if not _TIMESTAMP_RE.match(value):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _comparable(value: Any) -> Any:
+    """Timestamps as instants (like timestamptz, memoized), everything else unchanged"""
+    return _instant(value) if isinstance(value, str) else value
+
+
+# Filter operators: stored column value (never None) vs. the filter's prepared operand
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda value, operand: _comparable(value) == operand,
+    "neq": lambda value, operand: _comparable(value) != operand,
+    "gt": lambda value, operand: _comparable(value) > operand,
+    "gte": lambda value, operand: _comparable(value) >= operand,
+    "lt": lambda value, operand: _comparable(value) < operand,
+    "lte": lambda value, operand: _comparable(value) <= operand,
+    "in": lambda value, operand: _comparable(value) in operand,
+    "like": lambda value, operand: operand.match(str(value)) is not None,
+}
+
+
+def _matches(row: Dict[str, Any], filters: Tuple[Tuple[Any, ...], ...], embed: Optional[str] = None) -> bool:
+    """Whether row passes every filter aimed at embed (None: the queried table itself)"""
+    for target, name, op, operand in filters:
+        if target == embed:
+            value = row.get(name)
+            if value is None or not _OPERATORS[op](value, operand):
+                return False
+    return True
+
+
+def _like(pattern: str, case_sensitive: bool) -> "re.Pattern":
+    # A backslash makes the next character literal, as in Postgres LIKE
+    regex = "".join(
+        re.escape(literal) if literal else ".*" if ch == "%" else "." if ch == "_" else re.escape(ch)
+        for literal, ch in re.findall(r"\\(.)|(.)", pattern, re.DOTALL)
+    )
+    return re.compile(f"^{regex}$", 0 if case_sensitive else re.IGNORECASE | re.DOTALL)
+
+
+# alias:"table"!inner(columns) in a select string
+_EMBED_RE = re.compile(r'^(?:(\w+):)?"?([^"(!:]+?)"?(?:!(inner))?\((.*)\)$')
+
+
+def _split_columns(columns: str) -> List[str]:
+    """Top-level comma split of a select string (commas inside embeds are kept)"""
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+class LocalResponse:
+    """The parts of a postgrest APIResponse the app reads"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+        self.error = None
+
+
+class LocalDatabase:
+    """In-memory Barber_bookings and slots tables with PostgREST-like semantics and injected latency.
+
+    Reads see a consistent copy of the rows, writes and RPCs are atomic, and
+    every request sleeps `latency` seconds outside the lock, so concurrent
+    callers overlap the way they would against the hosted database.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 latency: float = LOCAL_LATENCY, max_rows: int = LOCAL_MAX_ROWS):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            name: [dict(row) for row in rows] for name, rows in (tables or {}).items()
+        }
+        self.tables.setdefault("Barber_bookings", [])
+        if slots_table.SLOTS_TABLE not in self.tables:
+            # Same backfill as migrations/002_slots_table.sql
+            self.tables[slots_table.SLOTS_TABLE] = self._backfill_slots()
+        self.latency = latency
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.functions: Dict[str, Callable[[Dict[str, Any]], Any]] = {RESERVE_SLOT_RPC: self._reserve_slot}
+        self._counts = {"queries": 0, "rpcs": 0}
+        # Valid until the next write, like an index: paging re-reads a cached scan
+        # and embeds look up children by foreign key instead of scanning
+        self._scans: "OrderedDict[Tuple[Any, ...], List[Dict[str, Any]]]" = OrderedDict()
+        self._groups: Dict[Tuple[str, str], Dict[Any, List[Dict[str, Any]]]] = {}
+
+    def _backfill_slots(self) -> List[Dict[str, Any]]:
+        rows = []
+        for barber in self.tables["Barber_bookings"]:
+            column = find_slot_column(barber)
+            for start_time in (barber.get(column) or []) if column else []:
+                rows.append({
+                    "id": len(rows) + 1, "barber_id": barber["id"], "start_time": start_time,
+                    "status": slots_table.AVAILABLE, "booked_at": None
+                })
+        return rows
+
+    def client(self) -> "LocalClient":
+        """Sync client over this database"""
+        return LocalClient(self)
+
+    def async_client(self) -> "AsyncLocalClient":
+        """Async client over this database"""
+        return AsyncLocalClient(self)
+
+    def stats(self) -> Dict[str, int]:
+        """Requests served so far (each one paid the injected latency)"""
+        with self.lock:
+            return dict(self._counts)
+
+    def _count(self, kind: str):
+        with self.lock:
+            self._counts[kind] += 1
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        if table not in self.tables:
+            raise RuntimeError(f'relation "{table}" does not exist')
+        return self.tables[table]
+
+    def changed(self):
+        """Drop cached scans and groupings after a write (call with the lock held)"""
+        self._scans.clear()
+        self._groups.clear()
+
+    def scan(self, table: str, filters: Tuple[Tuple[Any, ...], ...],
+             order: Tuple[Tuple[str, bool], ...]) -> List[Dict[str, Any]]:
+        """Rows of table passing filters, sorted by order (call with the lock held)"""
+        key = (table, filters, order)
+        rows = self._scans.get(key)
+        if rows is not None:
+            self._scans.move_to_end(key)
+            return rows
+        # Start from the smallest equality match, as an index on that column would
+        candidates = self.rows(table)
+        for target, name, op, operand in filters:
+            if target is None and op == "eq":
+                group = self.children(table, name, operand)
+                if len(group) < len(candidates):
+                    candidates = group
+        rows = [row for row in candidates if _matches(row, filters)]
+        for column, desc in reversed(order):
+            rows.sort(key=lambda row: (row.get(column) is None, _comparable(row.get(column))), reverse=desc)
+        self._scans[key] = rows
+        if len(self._scans) > SCAN_CACHE_SIZE:
+            self._scans.popitem(last=False)
+        return rows
+
+    def children(self, table: str, column: str, parent_id: Any) -> List[Dict[str, Any]]:
+        """Rows of table whose column equals parent_id (call with the lock held)"""
+        groups = self._groups.get((table, column))
+        if groups is None:
+            groups = {}
+            for row in self.rows(table):
+                groups.setdefault(_comparable(row.get(column)), []).append(row)
+            self._groups[(table, column)] = groups
+        return groups.get(_comparable(parent_id), [])
+
+    # ---------- RPC ----------
+    def call(self, name: str, params: Dict[str, Any]) -> Any:
+        function = self.functions.get(name)
+        if function is None:
+            raise RuntimeError(f"function {name} does not exist")
+        with self.lock:
+            try:
+                return function(params)
+            finally:
+                self.changed()
+
+    def _reserve_slot(self, params: Dict[str, Any]) -> str:
+        """reserve_slot from migration 001 (array column) or 002 (slots table), per SLOTS_SOURCE"""
+        barber_id, slot = params["p_barber_id"], _comparable(params["p_slot"])
+        barber = next((row for row in self.tables["Barber_bookings"] if row.get("id") == barber_id), None)
+        if slots_table.use_slots_table():
+            for row in self.children(slots_table.SLOTS_TABLE, "barber_id", barber_id):
+                if _comparable(row["start_time"]) == slot and row["status"] == slots_table.AVAILABLE:
+                    row.update(status="booked", booked_at=datetime.now(timezone.utc).isoformat())
+                    return RESERVED
+        elif barber is not None:
+            column = find_slot_column(barber)
+            stored = (barber.get(column) or []) if column else []
+            remaining = [s for s in stored if _comparable(s) != slot]
+            if len(remaining) < len(stored):
+                # array_remove: a new array, so readers holding the old one are unaffected
+                barber[column] = remaining
+                return RESERVED
+        return TAKEN if barber is not None else NOT_FOUND
+
+
+class LocalQuery:
+    """Query builder for one table: the subset of postgrest-py the app uses"""
+
+    def __init__(self, database: LocalDatabase, table: str):
+        self._db = database
+        self._table = table
+        self._columns = "*"
+        self._count = None
+        self._filters: List[Tuple[Optional[str], str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        # Per embedded resource (by alias or table name): order and limit of its rows
+        self._embed_order: Dict[str, List[Tuple[str, bool]]] = {}
+        self._embed_limit: Dict[str, int] = {}
+        self._offset = 0
+        self._write: Optional[Tuple[str, Any]] = None
+
+    # ---------- Statements ----------
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "LocalQuery":
+        self._columns = columns
+        self._count = count
+        return self
+
+    def update(self, values: Dict[str, Any]) -> "LocalQuery":
+        self._write = ("update", values)
+        return self
+
+    def insert(self, rows: Any) -> "LocalQuery":
+        self._write = ("insert", rows if isinstance(rows, list) else [rows])
+        return self
+
+    def delete(self) -> "LocalQuery":
+        self._write = ("delete", None)
+        return self
+
+    # ---------- Filters ----------
+    def _filter(self, column: str, op: str, operand: Any) -> "LocalQuery":
+        # "slots.status" filters the embedded slots, not the parent rows
+        embed, _, name = column.rpartition(".")
+        self._filters.append((embed or None, name, op, operand))
+        return self
+
+    def eq(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "eq", _comparable(value))
+
+    def neq(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "neq", _comparable(value))
+
+    def gt(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "gt", _comparable(value))
+
+    def gte(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "gte", _comparable(value))
+
+    def lt(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "lt", _comparable(value))
+
+    def lte(self, column: str, value: Any) -> "LocalQuery":
+        return self._filter(column, "lte", _comparable(value))
+
+    def in_(self, column: str, values: List[Any]) -> "LocalQuery":
+        return self._filter(column, "in", frozenset(_comparable(v) for v in values))
+
+    def like(self, column: str, pattern: str) -> "LocalQuery":
+        return self._filter(column, "like", _like(pattern, True))
+
+    def ilike(self, column: str, pattern: str) -> "LocalQuery":
+        return self._filter(column, "like", _like(pattern, False))
+
+    # ---------- Modifiers ----------
+    def order(self, column: str, desc: bool = False, foreign_table: Optional[str] = None) -> "LocalQuery":
+        if foreign_table:
+            self._embed_order.setdefault(foreign_table, []).append((column, desc))
+        else:
+            self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int, foreign_table: Optional[str] = None) -> "LocalQuery":
+        if foreign_table:
+            self._embed_limit[foreign_table] = count
+        else:
+            self._limit = count
+        return self
+
+    def range(self, start: int, end: int) -> "LocalQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # ---------- Execution ----------
+    def execute(self) -> LocalResponse:
+        time.sleep(self._db.latency)
+        return self._run()
+
+    def _project(self, table: str, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+        result = {}
+        for column in _split_columns(columns):
+            match = _EMBED_RE.match(column)
+            if match:
+                alias, embed, inner, embed_columns = match.groups()
+                result[alias or embed] = self._embedded(table, row, embed, embed_columns, alias or embed)
+                continue
+            name = column.strip('"')
+            if name == "*":
+                result.update(row)
+            elif name not in row:
+                raise RuntimeError(f'column {table}."{name}" does not exist')
+            else:
+                result[name] = row[name]
+        return result
+
+    def _embedded(self, table: str, row: Dict[str, Any], embed: str, columns: str, name: str) -> List[Dict[str, Any]]:
+        """Rows of embed belonging to row; name (the alias, else embed) selects filters, order and limit"""
+        foreign_key = FOREIGN_KEYS.get((table, embed))
+        if foreign_key is None:
+            raise RuntimeError(f"Could not find a relationship between '{table}' and '{embed}'")
+        filters = tuple(self._filters)
+        children = [
+            child for child in self._db.children(embed, foreign_key, row.get("id")) if _matches(child, filters, name)
+        ]
+        if columns.strip() == "count":
+            return [{"count": len(children)}]
+        order = self._embed_order.get(name)
+        if order:
+            for column, desc in reversed(order):
+                children.sort(key=lambda child: (child.get(column) is None, _comparable(child.get(column))), reverse=desc)
+        else:
+            children.sort(key=lambda child: _comparable(child.get("start_time") or child.get("id")))
+        if name in self._embed_limit:
+            children = children[:self._embed_limit[name]]
+        return [self._project(embed, child, columns) for child in children]
+
+    def _inner_embeds(self) -> List[str]:
+        matches = (_EMBED_RE.match(c) for c in _split_columns(self._columns))
+        return [m.group(1) or m.group(2) for m in matches if m and m.group(3)]
+
+    def _run(self) -> LocalResponse:
+        self._db._count("queries")
+        with self._db.lock:
+            if self._write:
+                return LocalResponse(self._apply_write())
+            matched = self._db.scan(self._table, tuple(self._filters), tuple(self._order))
+            limit = min(self._limit, self._db.max_rows) if self._limit is not None else self._db.max_rows
+            inner = self._inner_embeds()
+            if not inner and not self._count:
+                # Only the returned window needs projecting
+                matched = matched[self._offset:self._offset + limit]
+                return LocalResponse([self._project(self._table, row, self._columns) for row in matched])
+            projected = [self._project(self._table, row, self._columns) for row in matched]
+            for embed in inner:
+                projected = [row for row in projected if row.get(embed)]
+            count = len(projected) if self._count else None
+            return LocalResponse(projected[self._offset:self._offset + limit], count)
+
+    def _apply_write(self) -> List[Dict[str, Any]]:
+        kind, payload = self._write
+        rows = self._db.rows(self._table)
+        self._db.changed()
+        if kind == "insert":
+            return self._insert(rows, payload)
+        matched = [row for row in rows if _matches(row, tuple(self._filters))]
+        if kind == "update":
+            for row in matched:
+                row.update(payload)
+        else:
+            deleted = {id(row) for row in matched}
+            self._db.tables[self._table] = [row for row in rows if id(row) not in deleted]
+        return [dict(row) for row in matched]
+
+    def _insert(self, rows: List[Dict[str, Any]], new_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        next_id = max((row.get("id") or 0 for row in rows), default=0) + 1
+        inserted = []
+        for new_row in new_rows:
+            row = dict(new_row)
+            if "id" not in row:
+                row["id"] = next_id
+                next_id += 1
+            rows.append(row)
+            inserted.append(dict(row))
+        return inserted
+
+
+class _AsyncLocalQuery(LocalQuery):
+    async def execute(self) -> LocalResponse:
+        await asyncio.sleep(self._db.latency)
+        return self._run()
+
+
+class _LocalRpc:
+    def __init__(self, database: LocalDatabase, name: str, params: Dict[str, Any]):
+        self._db = database
+        self._name = name
+        self._params = params
+
+    def execute(self) -> LocalResponse:
+        time.sleep(self._db.latency)
+        self._db._count("rpcs")
+        return LocalResponse(self._db.call(self._name, self._params))
+
+
+class _AsyncLocalRpc(_LocalRpc):
+    async def execute(self) -> LocalResponse:
+        await asyncio.sleep(self._db.latency)
+        self._db._count("rpcs")
+        return LocalResponse(self._db.call(self._name, self._params))
+
+
+class LocalClient:
+    """Stands in for supabase.Client: table() and rpc() over a LocalDatabase"""
+
+    def __init__(self, database: LocalDatabase):
+        self.database = database
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self.database, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _LocalRpc:
+        return _LocalRpc(self.database, name, params)
+
+
+class AsyncLocalClient(LocalClient):
+    """Stands in for supabase.AsyncClient"""
+
+    def table(self, name: str) -> _AsyncLocalQuery:
+        return _AsyncLocalQuery(self.database, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _AsyncLocalRpc:
+        return _AsyncLocalRpc(self.database, name, params)
+
+
+def demo_tables(barbers: int = 8, days: int = 14) -> Dict[str, List[Dict[str, Any]]]:
+    """A small roster with hourly slots from tomorrow, for running the app without a database"""
+    services = ["Hair Cut, Beard Trim", "Fade, Hair Wash", "Shaving, Hair Cut", "Fade, Beard Trim"]
+    first = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return {"Barber_bookings": [
+        {
+            "id": i,
+            "Barber": f"Barber {i}",
+            "Services": services[i % len(services)],
+            slots_table.SLOT_COLUMN: [
+                (first + timedelta(days=d, hours=h)).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+                for d in range(days) for h in range(9, 18) if (h + i) % 3
+            ]
+        }
+        for i in range(1, barbers + 1)
+    ]}
+
+
+_local_database: Optional[LocalDatabase] = None
+_local_lock = threading.Lock()
+
+
+def local_database() -> LocalDatabase:
+    """The process-wide local database, seeded from SUPABASE_LOCAL_SEED on first use"""
+    global _local_database
+    with _local_lock:
+        if _local_database is None:
+            if LOCAL_SEED:
+                with open(LOCAL_SEED, encoding="utf-8") as f:
+                    tables = json.load(f)
+            else:
+                tables = demo_tables()
+            _local_database = LocalDatabase(tables)
+            logger.info(
+                f"Local Supabase backend: {len(_local_database.tables['Barber_bookings'])} barbers, "
+                f"{LOCAL_LATENCY * 1000:.0f}ms injected latency"
+            )
+        return _local_database
+
+
+def create_client(supabase_url: Optional[str], supabase_key: Optional[str]) -> Any:
+    """supabase.create_client(), or a client of the local database when SUPABASE_BACKEND=local"""
+    if uses_local_backend():
+        return local_database().client()
+    if _supabase_client is None:
+        raise RuntimeError("The supabase package is not installed (or set SUPABASE_BACKEND=local)")
+    return _supabase_client(supabase_url, supabase_key)
+
+
+async def acreate_client(supabase_url: Optional[str], supabase_key: Optional[str]) -> Any:
+    """supabase.acreate_client(), or an async client of the local database"""
+    if uses_local_backend():
+        return local_database().async_client()
+    if _asupabase_client is None:
+        raise RuntimeError("The supabase package is not installed (or set SUPABASE_BACKEND=local)")
+    return await _asupabase_client(supabase_url, supabase_key)
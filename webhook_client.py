@@ -0,0 +1,278 @@
+import os
+import re
+import time
+import asyncio
+import uuid
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+logger = logging.getLogger("webhook_client")
+
+CONNECT_TIMEOUT = float(os.getenv("N8N_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("N8N_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("N8N_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("N8N_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("N8N_BACKOFF_MAX", "8"))
+POOL_SIZE = int(os.getenv("N8N_POOL_SIZE", "10"))
+
+# Responses that mean the webhook did not process the booking and may be retried
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+_CALENDAR_LINK_RE = re.compile(r'https://www\.google\.com/calendar/event\?eid=([^\s]+)')
+
+
+def build_booking_payload(booking_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload sent to the n8n booking webhook"""
+    customer_email = booking_data.get("customer_email") or ""
+    return {
+        "event_type": "booking_created",
+        "booking_details": {
+            "barber_id": booking_data["barber_id"],
+            "barber_name": booking_data["barber_name"],
+            "service": booking_data["service"],
+            "appointment_time": booking_data["appointment_time"],
+            "customer_name": booking_data["customer_name"],
+            "customer_phone": booking_data["customer_phone"],
+            "customer_email": customer_email,
+            "status": "confirmed",
+            "created_at": datetime.now().isoformat(),
+            "salon_name": "AI Barber Salon",
+            "notes": f"Booking for {booking_data['service']} with {booking_data['barber_name']}"
+        },
+        "calendar_event": {
+            "summary": f"Barber Appointment - {booking_data['service']}",
+            "description": f"Customer: {booking_data['customer_name']}\nPhone: {booking_data['customer_phone']}\nEmail: {customer_email}\nService: {booking_data['service']}\nBarber: {booking_data['barber_name']}\nSalon: AI Barber Salon",
+            "start_time": booking_data["appointment_time"],
+            "duration_minutes": 60,  # Default 1 hour appointment
+            "attendees": [customer_email] if customer_email else [],
+            "location": "AI Barber Salon"
+        }
+    }
+
+
+def parse_booking_response(raw: Any) -> Dict[str, Any]:
+    """Booking fields from an n8n response body (dict, or list of Gemini-style messages)"""
+    if isinstance(raw, dict):
+        return raw
+    result = {}
+    if isinstance(raw, list) and raw and isinstance(raw[0], dict):
+        content = raw[0].get("content")
+        if isinstance(content, dict) and content.get("parts"):
+            # The calendar link is embedded in the confirmation email text
+            text = content["parts"][0].get("text", "")
+            match = _CALENDAR_LINK_RE.search(text)
+            if match:
+                result["calendar_link"] = match.group(0)
+    return result
+
+
+def _connect_failed(error: Exception) -> bool:
+    """Whether a requests error happened while connecting, before any of the request was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # Refused / unresolvable host: MaxRetryError wrapping NewConnectionError (a ConnectTimeoutError).
+        # "Connection aborted" on a reused keep-alive socket is a ProtocolError instead, after sending.
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed send certainly left the booking unprocessed, so resending is safe"""
+    if _connect_failed(error):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUSES
+    return False
+
+
+def may_have_delivered(error: Exception) -> bool:
+    """Whether n8n may have received the booking before the send failed, so resending could duplicate it"""
+    if isinstance(error, (requests.exceptions.ReadTimeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    return isinstance(error, requests.exceptions.ConnectionError) and not _connect_failed(error)
+
+
+def _response_body(response) -> Any:
+    if not response.content:
+        return {}
+    try:
+        return response.json()
+    except ValueError:
+        logger.warning("Could not parse n8n response as JSON, treating as success")
+        return {}
+
+
+class WebhookClient:
+    """Keep-alive client for the n8n webhook with bounded, jittered retries and latency metrics.
+
+    Only failures where n8n cannot have processed the booking are retried
+    (failures to connect, 429 and gateway errors). Read timeouts and dropped
+    connections are not, since the booking may already exist; every attempt carries the same
+    Idempotency-Key (the caller's, if given) so the workflow can drop duplicates.
+    """
+
+    def __init__(self, url: str, user_agent: str = "BarberSalon/1.0",
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, pool_size: int = POOL_SIZE):
+        self.url = url
+        self.headers = {"Content-Type": "application/json", "User-Agent": user_agent}
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update(self.headers)
+        self._pool_size = pool_size
+        # Bound to the event loop that first uses it
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring a numeric Retry-After"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, started: float, attempts: int, failed: bool):
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+            self.calls += 1
+            self.retries += attempts - 1
+            if failed:
+                self.failures += 1
+
+    def post(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None,
+             max_retries: Optional[int] = None) -> requests.Response:
+        """POST payload, retrying transient failures; raises requests exceptions on final failure
+
+        max_retries overrides the client's limit for this call (0 for callers with their own backoff).
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        headers = {"Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and attempt < max_retries:
+                    delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                    logger.warning(f"n8n webhook returned {response.status_code}, retrying in {delay:.2f}s")
+                else:
+                    response.raise_for_status()
+                    self._record(started, attempt + 1, False)
+                    return response
+            except requests.exceptions.ConnectionError as e:
+                # Only connect-phase failures are retried (see class docstring)
+                if not _connect_failed(e) or attempt >= max_retries:
+                    self._record(started, attempt + 1, True)
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"n8n webhook connection failed ({str(e)}), retrying in {delay:.2f}s")
+            except requests.exceptions.RequestException:
+                self._record(started, attempt + 1, True)
+                raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def apost(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> httpx.Response:
+        """Async post() on a pooled httpx client; raises httpx exceptions on final failure"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size)
+            )
+        headers = {"Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = await self._async_client.post(self.url, json=payload, headers=headers)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                    logger.warning(f"n8n webhook returned {response.status_code}, retrying in {delay:.2f}s")
+                else:
+                    response.raise_for_status()
+                    self._record(started, attempt + 1, False)
+                    return response
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt >= self.max_retries:
+                    self._record(started, attempt + 1, True)
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"n8n webhook connection failed ({str(e)}), retrying in {delay:.2f}s")
+            except httpx.HTTPError:
+                self._record(started, attempt + 1, True)
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def send_booking(self, booking_data: Dict[str, Any], idempotency_key: Optional[str] = None,
+                     max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Send a booking and return the parsed n8n response"""
+        raw = _response_body(self.post(build_booking_payload(booking_data), idempotency_key, max_retries))
+        logger.info(f"n8n webhook response: {raw}")
+        return parse_booking_response(raw)
+
+    async def asend_booking(self, booking_data: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Async send_booking()"""
+        raw = _response_body(await self.apost(build_booking_payload(booking_data), idempotency_key))
+        logger.info(f"n8n webhook response: {raw}")
+        return parse_booking_response(raw)
+
+    async def aclose(self):
+        """Close the async connection pool"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Call, retry and latency metrics"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, retries, failures = self.calls, self.retries, self.failures
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "calls": calls,
+            "retries": retries,
+            "failures": failures,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": percentile(1.0)
+        }
+
+
+_clients: Dict[Tuple[str, str], WebhookClient] = {}
+_clients_lock = threading.Lock()
+
+
+def webhook_client_for(url: str, user_agent: str = "BarberSalon/1.0") -> WebhookClient:
+    """Process-wide client (and connection pool) for a webhook URL"""
+    with _clients_lock:
+        client = _clients.get((url, user_agent))
+        if client is None:
+            client = _clients[(url, user_agent)] = WebhookClient(url, user_agent)
+        return client